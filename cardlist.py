@@ -1,20 +1,23 @@
-import requests
 import json
 import csv
 from bs4 import BeautifulSoup
+from scraping import FAST_PARSER, HTTP_CACHE_DIR, WIKITABLE_STRAINER, TokenBucket, make_session
 
 
 class CardList:
     BASE_URL = "https://yugipedia.com"
     PAGE_URL = "https://yugipedia.com/wiki/List_of_Yu-Gi-Oh!_Duel_Monsters_cards"
 
-    def __init__(self):
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, parser=FAST_PARSER, strain=True, rate=1.0):
+        # Revalidates the cached page instead of re-downloading; retries wait for the rate limit too
+        self.session = make_session(cache_dir=cache_dir, rate_limit=TokenBucket(rate))
+        self.parser = parser
+        self.strain = strain  # Only build the wikitables
         self.table_data = []
 
     def fetch_html(self, url):
         """Fetch HTML content from a given URL."""
-        headers = {'User-Agent': 'Mozilla/5.0 (compatible; Bot/0.1)'}
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, timeout=30)
         response.raise_for_status()
         return response.text
 
@@ -24,7 +27,7 @@ class CardList:
         For each row, if the header is "Card", the method looks for an <a> tag in the cell,
         extracts its href attribute, and stores it as a new key "Card_href" with the full URL.
         """
-        soup = BeautifulSoup(html_content, "html.parser")
+        soup = BeautifulSoup(html_content, self.parser, parse_only=WIKITABLE_STRAINER if self.strain else None)
         data = []
         tables = soup.find_all("table", class_="wikitable")
 
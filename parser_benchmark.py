@@ -0,0 +1,115 @@
+"""
+Benchmark the HTML parsing backends of the scrapers over saved pages.
+
+Every backend (html.parser and, when installed, lxml; each with and without the
+SoupStrainer fast path) parses the saved card pages in <dir>/cards/ and the list page
+<dir>/card_list.html. Its output must be identical to the plain html.parser parse
+the scrapers originally used; pages/sec is reported separately for card pages and
+the list page (parsed by both CardList and CardDetails), from the best of
+`--repeat` runs.
+
+Pages captured from the live site with --capture are kept in html/captured/ and used
+when present; otherwise the hand-written pages in html/synthetic/ are used, whose
+timings only show the backends' relative speed (see html/synthetic/README.md).
+
+    python parser_benchmark.py [--dir DIR] [--repeat 5]
+    python parser_benchmark.py --capture 8 [--dir DIR]
+
+Exits with status 1 if any backend's output differs.
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from bs4.builder import builder_registry
+
+from carddetails import CardDetails
+from cardlist import CardList
+
+REFERENCE = ("html.parser", False)
+CAPTURED_DIR = Path("html/captured")
+SYNTHETIC_DIR = Path("html/synthetic")
+
+
+def backends():
+    parsers = ["html.parser"] + (["lxml"] if builder_registry.lookup("lxml") else [])
+    return [(parser, strain) for parser in parsers for strain in (False, True)]
+
+
+def parse_cards(card_pages, parser, strain):
+    return [CardDetails.parse_card_page(html, parser, strain) for html in card_pages]
+
+
+def parse_list(list_page, parser, strain):
+    card_list = CardList(cache_dir=None, parser=parser, strain=strain)
+    card_details = CardDetails(cache_dir=None, parser=parser, strain=strain)
+    return card_list.extract_table_data(list_page), card_details.parse_card_links(list_page)
+
+
+def best_time(repeat, func, *args):
+    """Return the output of func(*args) and its fastest wall time over `repeat` runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def capture(html_dir, count):
+    """Save the live list page and `count` card pages spread evenly over it into `html_dir`."""
+    html_dir = Path(html_dir)
+    (html_dir / "cards").mkdir(parents=True, exist_ok=True)
+    scraper = CardDetails(cache_dir=None)
+    list_page = scraper.fetch_html(scraper.list_page_url)
+    (html_dir / "card_list.html").write_text(list_page, encoding="utf-8")
+    links = scraper.parse_card_links(list_page)
+    step = max(1, len(links) // count)
+    for number, link in enumerate(links[::step][:count], start=1):
+        name = re.sub(r"[\W_]+", "_", link.rsplit("/", 1)[-1]).strip("_")[:40]
+        (html_dir / "cards" / f"{number:03d}_{name}.html").write_text(scraper.fetch_html(link), encoding="utf-8")
+    print(f"Saved the list page and {min(count, len(links[::step]))} card pages to {html_dir}")
+
+
+def run(html_dir, repeat):
+    html_dir = Path(html_dir)
+    card_pages = [path.read_text(encoding="utf-8") for path in sorted((html_dir / "cards").glob("*.html"))]
+    list_page = (html_dir / "card_list.html").read_text(encoding="utf-8")
+    expected_cards = parse_cards(card_pages, *REFERENCE)
+    expected_list = parse_list(list_page, *REFERENCE)
+
+    all_identical = True
+    print(f"{len(card_pages)} card pages and the card list from {html_dir}, best of {repeat} runs")
+    if html_dir.resolve() == SYNTHETIC_DIR.resolve():
+        print("These are synthetic pages: compare the backends with each other, not with live pages.")
+    print(f"{'backend':<25} {'card pages/sec':>14} {'list pages/sec':>14}  output")
+    for parser, strain in backends():
+        cards, card_time = best_time(repeat, parse_cards, card_pages, parser, strain)
+        card_list, list_time = best_time(repeat, parse_list, list_page, parser, strain)
+        identical = cards == expected_cards and card_list == expected_list
+        all_identical = all_identical and identical
+        name = f"{parser}{' + strainer' if strain else ''}"
+        print(f"{name:<25} {len(card_pages) / card_time:14.1f} {1 / list_time:14.1f}  "
+              f"{'identical' if identical else 'DIFFERENT'}")
+    if "lxml" not in dict(backends()):
+        print("lxml is not installed; only html.parser was measured.")
+    return all_identical
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--dir", default=None,
+                            help="Directory of saved pages (cards/*.html and card_list.html); defaults to "
+                                 f"{CAPTURED_DIR} if it exists, else {SYNTHETIC_DIR}")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Runs per backend")
+    arg_parser.add_argument("--capture", type=int, metavar="N",
+                            help=f"Save the live list page and N card pages to --dir (default {CAPTURED_DIR}) "
+                                 "instead of benchmarking")
+    args = arg_parser.parse_args()
+    if args.capture:
+        capture(args.dir or CAPTURED_DIR, args.capture)
+        sys.exit(0)
+    html_dir = args.dir or (CAPTURED_DIR if CAPTURED_DIR.exists() else SYNTHETIC_DIR)
+    sys.exit(0 if run(html_dir, args.repeat) else 1)
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from bs4 import SoupStrainer
+from bs4.builder import builder_registry
+from cachecontrol import CacheControlAdapter
+from cachecontrol.caches import FileCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = 'Mozilla/5.0 (compatible; Bot/0.1)'
+HTTP_CACHE_DIR = 'cache/http'
+
+# The fastest BeautifulSoup backend installed: lxml (in requirements.txt), else the built-in html.parser.
+FAST_PARSER = 'lxml' if builder_registry.lookup('lxml') else 'html.parser'
+
+
+def class_strainer(name, *classes):
+    """
+    Return a SoupStrainer keeping `name` tags (and everything inside them) that have
+    any of `classes`. While parsing, the class attribute is still a single string, so
+    class_="wikitable" alone would miss <table class="wikitable sortable">.
+    """
+    wanted = set(classes)
+    return SoupStrainer(name, class_=lambda value: bool(value) and not wanted.isdisjoint(value.split()))
+
+
+# The list pages only need their wikitables parsed.
+WIKITABLE_STRAINER = class_strainer('table', 'wikitable')
+
+
+class TokenBucket:
+    """
+    Thread-safe rate limiter: allows `rate` requests per second on average, with bursts
+    of up to `capacity` requests after an idle spell.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedRetry(Retry):
+    """Retry that takes a token from `rate_limit` before each retried attempt."""
+
+    def __init__(self, *args, rate_limit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limit = rate_limit
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.rate_limit = self.rate_limit
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limit:
+            self.rate_limit.acquire()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that takes a token from `rate_limit` before sending a request. urllib3
+    retries inside send(), so the adapter's RateLimitedRetry covers those attempts.
+    """
+
+    def __init__(self, rate_limit=None, **kwargs):
+        self.rate_limit = rate_limit
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.rate_limit:
+            self.rate_limit.acquire()
+        return super().send(request, **kwargs)
+
+
+class RateLimitedCacheAdapter(CacheControlAdapter, RateLimitedAdapter):
+    """CacheControlAdapter whose network requests (not fresh cache hits) are rate limited."""
+
+
+def make_session(pool_size=10, retries=3, backoff=1.0, cache_dir=None, rate_limit=None):
+    """
+    Return a keep-alive session whose connection pool holds `pool_size` connections per
+    host. Connection errors and 429/5xx responses are retried up to `retries` times
+    with exponential backoff (honouring Retry-After). With `rate_limit` (a
+    TokenBucket), every HTTP attempt, retries included, waits for a token. With
+    `cache_dir`, responses are kept in an on-disk HTTP cache keyed by URL and
+    revalidated with conditional requests (If-None-Match / If-Modified-Since); a 304
+    is served from the cache and the response's `from_cache` is True.
+    """
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    retry = RateLimitedRetry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+        rate_limit=rate_limit,
+    )
+    if cache_dir:
+        adapter = RateLimitedCacheAdapter(cache=FileCache(cache_dir), pool_connections=1, pool_maxsize=pool_size,
+                                          max_retries=retry, rate_limit=rate_limit)
+    else:
+        adapter = RateLimitedAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry,
+                                     rate_limit=rate_limit)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class Checkpoint:
+    """
+    Parsed pages keyed by URL, appended to an NDJSON file as each one completes so an
+    interrupted run keeps its progress. When a URL is saved twice the last line wins.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A blank line, or one cut short by a crash
+                    self.records[entry['url']] = entry['data']
+
+    def __contains__(self, url):
+        return url in self.records
+
+    def get(self, url):
+        return self.records.get(url)
+
+    def save(self, url, data):
+        """Record the parsed data of a URL and append it to the file."""
+        with self.lock:
+            self.records[url] = data
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'url': url, 'data': data}, ensure_ascii=False) + '\n')
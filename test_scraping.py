@@ -0,0 +1,114 @@
+"""
+Tests for the scraper helpers against a local HTTP stand-in (no network access).
+
+    python -m unittest test_scraping
+"""
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from carddetails import CardDetails
+from scraping import Checkpoint, TokenBucket, make_session
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Serves /flaky as a 503 on its first request and every other path as a card page named after it."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((time.monotonic(), self.path))
+            flaky = self.path == "/flaky" and server.failures.get(self.path, 0) < 1
+            if flaky:
+                server.failures[self.path] = 1
+        page = f'<html><body><div class="heading"><div>{self.path}</div></div></body></html>'
+        body = b"busy" if flaky else page.encode()
+        self.send_response(503 if flaky else 200)
+        if flaky:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.failures = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ScrapingSessionTest(StandInTestCase):
+    RATE = 10.0
+
+    def test_every_attempt_waits_for_the_rate_limit(self):
+        session = make_session(pool_size=4, retries=2, backoff=0, rate_limit=TokenBucket(self.RATE))
+        response = session.get(f"{self.base}/flaky", timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("<div>/flaky</div>", response.text)
+        for path in ("/a", "/b", "/c"):
+            self.assertEqual(session.get(self.base + path, timeout=5).status_code, 200)
+
+        # The retry of /flaky happens inside urllib3, yet is spaced like the other requests.
+        times, paths = zip(*self.server.requests)
+        self.assertEqual(paths, ("/flaky", "/flaky", "/a", "/b", "/c"))
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        self.assertGreater(min(gaps), 0.8 / self.RATE)
+
+    def test_retries_give_up_with_the_last_response(self):
+        session = make_session(retries=0, backoff=0)
+        self.assertEqual(session.get(f"{self.base}/flaky", timeout=5).status_code, 503)
+
+
+class CardDetailsScrapeTest(StandInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = os.path.join(self.tmpdir.name, "json", "cards.ndjson")
+
+    def tearDown(self):
+        super().tearDown()
+        self.tmpdir.cleanup()
+
+    def scrape(self, links):
+        scraper = CardDetails(base_url=self.base, rate=50.0, backoff=0, cache_dir=None,
+                              checkpoint_path=self.checkpoint_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return scraper.scrape(links)
+
+    def test_scrape_checkpoints_and_resumes(self):
+        links = [f"{self.base}/card/{number}" for number in range(1, 6)]
+        cards = self.scrape(links)
+        self.assertEqual([card["card_name"] for card in cards], [f"/card/{number}" for number in range(1, 6)])
+        self.assertEqual(len(self.server.requests), 5)
+
+        # A second run finds every card in the checkpoint and fetches nothing.
+        self.assertEqual(self.scrape(links), cards)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_checkpoint_write_errors_stop_the_run(self):
+        links = [f"{self.base}/card/{number}" for number in range(1, 4)]
+        with mock.patch.object(Checkpoint, "save", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.scrape(links)
+
+
+if __name__ == "__main__":
+    unittest.main()
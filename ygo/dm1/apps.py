@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class Dm1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dm1'
+
+    def ready(self):
+        from .signals import connect_signals
+        connect_signals()
@@ -0,0 +1,174 @@
+"""
+Benchmark suite for the fusion routines and the collection/fusion views.
+
+Datasets are seeded into the current database, either from the shipped fixtures or
+synthetically at a multiple of the fixtures' size. Every benchmark records wall time
+and the number of SQL queries per run. `manage.py run_benchmarks` runs the suite
+against a throwaway test database and writes the results as JSON so runs from
+different commits can be compared.
+"""
+import random
+import statistics
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from .fusion_index import FusionIndex, get_fusion_index
+from .models import Card, CardCollection, CardInfo, Fusion, FusionMaterialGroup
+from .signals import reference_data_changed
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# Size of the shipped fixtures, which synthetic datasets are multiples of.
+BASE_CARDS = 365
+BASE_FUSIONS = 27
+BASE_GROUPS = 30
+
+BENCHMARK_USERNAME = "benchmark"
+HAND_SIZE = 5
+BATCH_HANDS = 50
+
+
+def seed_fixtures():
+    """Load the shipped card and fusion fixtures; load_fusions links each fusion to its result card."""
+    call_command("load_cards", str(FIXTURES_DIR / "card_details_formatted.json"), stdout=StringIO())
+    call_command("load_fusions", str(FIXTURES_DIR / "fusions_fixture_fusions.json"),
+                 str(FIXTURES_DIR / "fusions_fixture_material_groups.json"), stdout=StringIO())
+    return "fixtures"
+
+
+def seed_synthetic(scale, seed=0):
+    """
+    Create a synthetic card and fusion set `scale` times the size of the fixtures.
+    Material groups mimic the fixtures: 1-3 cards on one side and 1-30 on the other.
+    """
+    rng = random.Random(seed)
+    n_cards = BASE_CARDS * scale
+    n_fusions = BASE_FUSIONS * scale
+    n_groups = BASE_GROUPS * scale
+
+    with transaction.atomic():
+        cards = Card.objects.bulk_create(
+            [Card(card_name=f"Synthetic Card {number}") for number in range(1, n_cards + 1)], batch_size=1000
+        )
+        stats = [(rng.randrange(0, 3100, 100), rng.randrange(0, 3100, 100)) for _ in cards]
+        CardInfo.objects.bulk_create(
+            [CardInfo(card=card, number=number, atk_def=f"{atk} / {defense}", atk=atk, defense=defense,
+                      card_type="Synthetic", rarity="C", lore="")
+             for number, (card, (atk, defense)) in enumerate(zip(cards, stats), start=1)],
+            batch_size=1000,
+        )
+        results = rng.sample(cards, n_fusions)
+        fusions = Fusion.objects.bulk_create(
+            [Fusion(number=i, name=f"Synthetic Fusion {i}", result_card=result)
+             for i, result in enumerate(results, start=1)],
+            batch_size=1000,
+        )
+        groups = FusionMaterialGroup.objects.bulk_create(
+            [FusionMaterialGroup(fusion=fusions[i % n_fusions]) for i in range(n_groups)], batch_size=1000
+        )
+        material1 = FusionMaterialGroup.material1.through
+        material2 = FusionMaterialGroup.material2.through
+        rows1 = []
+        rows2 = []
+        for group in groups:
+            for card in rng.sample(cards, rng.randint(1, 3)):
+                rows1.append(material1(fusionmaterialgroup_id=group.pk, card_id=card.pk))
+            for card in rng.sample(cards, rng.randint(1, 30)):
+                rows2.append(material2(fusionmaterialgroup_id=group.pk, card_id=card.pk))
+        material1.objects.bulk_create(rows1, batch_size=1000)
+        material2.objects.bulk_create(rows2, batch_size=1000)
+
+    # bulk_create sends no signals, so drop the in-memory card and fusion data explicitly.
+    reference_data_changed()
+    return f"synthetic-x{scale}"
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries without keeping them in memory."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(name, func, repeat, setup=None):
+    """Run func() `repeat` times and return its timing and query-count summary."""
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+    return {
+        "name": name,
+        "runs": repeat,
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.mean(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "queries": max(queries),
+    }
+
+
+def run_suite(dataset, repeat=10, seed=0):
+    """Benchmark the fusion routines and views against the data currently in the database."""
+    rng = random.Random(seed)
+    user, _ = get_user_model().objects.get_or_create(username=BENCHMARK_USERNAME)
+    card_ids = list(Card.objects.values_list("pk", flat=True))
+    CardCollection.objects.bulk_create(
+        [CardCollection(user=user, card_id=card_id, quantity=1) for card_id in card_ids],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    client = Client()
+    client.force_login(user)
+
+    def hands():
+        while True:
+            yield rng.sample(card_ids, HAND_SIZE)
+
+    hand = hands()
+    index = get_fusion_index()
+    search_url = reverse("fusion_search_api")
+    batch_url = reverse("fusion_search_batch_api")
+    deck_url = reverse("deck_fusion_calculator")
+    collection_url = reverse("collection_edit")
+
+    results = [
+        measure("fusion_index.build", FusionIndex.build, repeat),
+        measure("fusion_index.fusions_for_hand", lambda: index.fusions_for_hand(next(hand)), repeat),
+        measure("fusion_index.fusion_chains", lambda: index.fusion_chains(next(hand)), repeat),
+        measure("fusion_index.collection_fusions", lambda: index.collection_fusions(card_ids), repeat),
+        measure("view.fusion_search_api",
+                lambda: client.get(search_url, {"cards": ",".join(map(str, next(hand)))}), repeat),
+        measure("view.fusion_search_batch_api",
+                lambda: client.post(batch_url, {"hands": [next(hand) for _ in range(BATCH_HANDS)]},
+                                    content_type="application/json"), repeat),
+        measure("view.deck_fusion_calculator.cold", lambda: client.get(deck_url), repeat, setup=cache.clear),
+        measure("view.deck_fusion_calculator.warm", lambda: client.get(deck_url), repeat),
+        measure("view.edit_collection", lambda: client.get(collection_url), repeat),
+    ]
+    summary = {
+        "cards": len(card_ids),
+        "fusions": Fusion.objects.count(),
+        "material_groups": FusionMaterialGroup.objects.count(),
+    }
+    for result in results:
+        result["dataset"] = dataset
+        result.update(summary)
+    return results
@@ -0,0 +1,121 @@
+import time
+
+from django.core.cache import cache, caches
+
+DECK_FUSIONS_TIMEOUT = 60 * 60 * 24
+
+# Process-private caches for throwaway data (tests, run_benchmarks), so its stamps and
+# cached pages never reach the shared caches. Use with override_settings(CACHES=...).
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'versions'},
+}
+
+
+def _version(key):
+    # The stamps live in their own cache alias, which is never culled (see settings.CACHES).
+    return caches['versions'].get_or_set(key, time.time_ns, None)
+
+
+def _bump(key):
+    version = time.time_ns()
+    caches['versions'].set(key, version, None)
+    return version
+
+
+def collection_version(user_id):
+    """Return the current version stamp of a user's card collection."""
+    return _version(f"dm1:collection_version:{user_id}")
+
+
+def bump_collection_version(user_id):
+    """Mark a user's collection as changed and return its new version stamp."""
+    return _bump(f"dm1:collection_version:{user_id}")
+
+
+def fusion_data_version():
+    """Return the current version stamp of the card and fusion data."""
+    return _version("dm1:fusion_data_version")
+
+
+def bump_fusion_data_version():
+    """Mark the card and fusion data as changed."""
+    return _bump("dm1:fusion_data_version")
+
+
+def card_data_version():
+    """Return the current version stamp of the cards and their language, image and info rows."""
+    return _version("dm1:card_data_version")
+
+
+def bump_card_data_version():
+    """Mark the card data as changed."""
+    return _bump("dm1:card_data_version")
+
+
+def reference_data_version():
+    """
+    Return the version stamp of everything the card and fusion pages show: the later
+    of the card and fusion data versions. Stamps are time.time_ns() values, so this
+    doubles as the pages' modification time.
+    """
+    return max(card_data_version(), fusion_data_version())
+
+
+def _count(name):
+    key = f"dm1:deck_fusions:{name}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter was evicted between add() and incr().
+        cache.set(key, 1, None)
+
+
+def get_deck_fusions(user_id, compute):
+    """
+    Return the deck fusion results of a user, calling compute() only when nothing is
+    cached for the current collection and fusion data versions.
+    """
+    key = f"dm1:deck_fusions:{user_id}:{collection_version(user_id)}:{fusion_data_version()}"
+    result = cache.get(key)
+    if result is None:
+        _count("misses")
+        result = compute()
+        cache.set(key, result, DECK_FUSIONS_TIMEOUT)
+    else:
+        _count("hits")
+    return result
+
+
+def get_optimized_deck(user_id, seconds, compute, cooldown):
+    """
+    Return the deck search result of a user for the current collection and fusion data
+    versions, calling compute() only when nothing is cached. A user may start at most
+    one search per `cooldown` seconds; None is returned when a search is refused.
+    """
+    key = f"dm1:optimized_deck:{user_id}:{collection_version(user_id)}:{fusion_data_version()}:{seconds:g}"
+    result = cache.get(key)
+    if result is None:
+        run_key = f"dm1:optimizer_run:{user_id}"
+        if not cache.add(run_key, True, cooldown):
+            return None
+        try:
+            result = compute()
+        except Exception:
+            cache.delete(run_key)
+            raise
+        cache.set(key, result, DECK_FUSIONS_TIMEOUT)
+    return result
+
+
+def deck_fusion_cache_stats():
+    """Return the deck fusion cache hit and miss counters."""
+    hits = cache.get("dm1:deck_fusions:hits", 0)
+    misses = cache.get("dm1:deck_fusions:misses", 0)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
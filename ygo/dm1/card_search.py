@@ -0,0 +1,206 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from rapidfuzz import fuzz, process
+
+from .caching import card_data_version
+from .models import Card, Language
+
+AUTOCOMPLETE_LIMIT = 10
+FUZZY_MIN_LENGTH = 3
+FUZZY_SCORE_CUTOFF = 80
+RESPONSE_CACHE_SIZE = 4096
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize(text):
+    """Casefold a name and drop the accents of Latin letters (Rōmaji ō -> o), keeping kana intact."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").casefold())
+    kept = []
+    for char in decomposed:
+        # Only strip marks from ASCII letters; kana dakuten are combining marks as well.
+        if unicodedata.combining(char) and kept and kept[-1].isascii():
+            continue
+        kept.append(char)
+    return unicodedata.normalize("NFC", "".join(kept)).strip()
+
+
+def _word_starts(name):
+    """Yield the offsets of every word in a normalized name, the whole name first."""
+    yield 0
+    for i in range(1, len(name)):
+        if not name[i - 1].isalnum() and name[i].isalnum():
+            yield i
+
+
+class _TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []
+
+
+class CardSearchIndex:
+    """
+    In-memory autocomplete over every card name variant: the card name and the
+    Japanese, Rōmaji and translated names.
+
+    Every word of every variant is inserted into a prefix trie whose nodes keep their
+    matches pre-ranked (name prefix before word prefix, then shorter names, then card
+    number), so a prefix lookup costs the prefix length plus the results read. Queries
+    without 10 prefix matches are topped up with cards matching each query word, and
+    queries matching nothing fall back to a rapidfuzz match over all variants, which
+    tolerates typos. Results are cached
+    per normalized query, so hot prefixes skip the lookup entirely.
+    """
+
+    def __init__(self, cards, variants):
+        self.cards = cards                  # card pk -> (card name, card number)
+        self.variants = []                  # (normalized name, card pk, original name)
+        self.root = _TrieNode()
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+        for card_id, name in variants:
+            normalized = normalize(name)
+            if normalized and card_id in cards:
+                self.variants.append((normalized, card_id, name))
+        self._choices = [normalized for normalized, _, _ in self.variants]
+
+        for position, (normalized, card_id, _) in enumerate(self.variants):
+            for start in _word_starts(normalized):
+                rank = (start > 0, len(normalized), cards[card_id][1] or 0, card_id)
+                node = self.root
+                for char in normalized[start:]:
+                    node = node.children.setdefault(char, _TrieNode())
+                    node.entries.append((rank, position))
+        self._sort(self.root)
+
+    @classmethod
+    def build(cls):
+        """Build the index with two queries: cards with their number, and their language rows."""
+        cards = {pk: (name, number) for pk, name, number in
+                 Card.objects.values_list("pk", "card_name", "card_info__number")}
+        variants = [(pk, name) for pk, (name, _) in cards.items()]
+        for card_id, japanese, romaaji, translated in \
+                Language.objects.values_list("card_id", "japanese", "romaaji", "translated"):
+            variants.extend((card_id, name) for name in (japanese, romaaji, translated))
+        return cls(cards, variants)
+
+    def _sort(self, root):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            node.entries.sort()
+            node.entries = [position for _, position in node.entries]
+            stack.extend(node.children.values())
+
+    def _result(self, position):
+        _, card_id, name = self.variants[position]
+        card_name = self.cards[card_id][0]
+        label = card_name if normalize(name) == normalize(card_name) else f"{card_name} ({name})"
+        return {"id": card_id, "label": label, "value": card_name}
+
+    def _node(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _first_cards(self, positions, seen, limit):
+        """Keep the first position of each card not in `seen`, up to `limit` of them."""
+        found = []
+        for position in positions:
+            card_id = self.variants[position][1]
+            if card_id not in seen:
+                seen.add(card_id)
+                found.append(position)
+                if len(found) == limit:
+                    break
+        return found
+
+    def prefix_matches(self, query, seen, limit=AUTOCOMPLETE_LIMIT):
+        """Return the variant positions of up to `limit` cards with a word starting with `query`."""
+        node = self._node(query)
+        return self._first_cards(node.entries, seen, limit) if node else []
+
+    def word_matches(self, words, seen, limit=AUTOCOMPLETE_LIMIT):
+        """Return the variant positions of up to `limit` cards with a word starting with each of `words`."""
+        nodes = [self._node(word) for word in words]
+        if not all(nodes):
+            return []
+        nodes.sort(key=lambda node: len(node.entries))
+        others = [set(node.entries) for node in nodes[1:]]
+        positions = (position for position in nodes[0].entries if all(position in other for other in others))
+        return self._first_cards(positions, seen, limit)
+
+    def fuzzy_matches(self, query, seen, limit=AUTOCOMPLETE_LIMIT):
+        """Return the variant positions of up to `limit` cards whose names are close to `query`."""
+        matches = process.extract(query, self._choices, scorer=fuzz.WRatio, processor=None, limit=limit * 4,
+                                  score_cutoff=FUZZY_SCORE_CUTOFF)
+        return self._first_cards((position for _, _, position in matches), seen, limit)
+
+    def search(self, term, limit=AUTOCOMPLETE_LIMIT):
+        """Return up to `limit` ranked {"id", "label", "value"} matches for an autocomplete term."""
+        query = normalize(term)
+        if not query:
+            return []
+        key = (query, limit)
+        with self._lock:
+            results = self._responses.get(key)
+            if results is not None:
+                self._responses.move_to_end(key)
+                return results
+
+        # Whole-query prefix matches rank first, then cards matching every word of the
+        # query ("blue eyes" for "Blue-Eyes"); fuzzy matching only runs when neither
+        # found anything, as it scans every variant.
+        seen = set()
+        positions = self.prefix_matches(query, seen, limit)
+        words = _WORD.findall(query)
+        if len(positions) < limit and len(words) > 1:
+            positions += self.word_matches(words, seen, limit - len(positions))
+        if not positions and len(query) >= FUZZY_MIN_LENGTH:
+            positions += self.fuzzy_matches(query, seen, limit - len(positions))
+        results = [self._result(position) for position in positions]
+
+        with self._lock:
+            self._responses[key] = results
+            if len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+        return results
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_card_search_index():
+    """
+    Return the process-wide card search index, building it on first use and again
+    whenever the shared card data version moves (a data load in another process).
+    """
+    global _index, _index_version
+    version = card_data_version()
+    index = _index
+    if index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = CardSearchIndex.build()
+                _index_version = version
+            index = _index
+    return index
+
+
+def invalidate_card_search_index(**kwargs):
+    """Drop the card search index so the next lookup rebuilds it."""
+    global _index
+    with _lock:
+        _index = None
@@ -0,0 +1,153 @@
+"""
+Collection import and export keyed by card number.
+
+Exports stream the user's collection as CSV or as a JSON array of
+{"number", "card_name", "quantity"} rows. Imports read the same formats (card_name is
+informational and ignored), resolve card numbers with one query and upsert the
+quantities in batches, all in one transaction, so a bad line leaves the collection
+untouched.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+
+from .caching import bump_collection_version
+from .models import MAX_INTEGER, CardCollection, CardInfo
+
+COLLECTION_FORMATS = {
+    "csv": "text/csv",
+    "json": "application/json",
+}
+COLLECTION_FIELDS = ["number", "card_name", "quantity"]
+CHUNK_SIZE = 500
+
+
+class CollectionImportError(Exception):
+    """Raised when an import file cannot be read or names unknown cards."""
+
+
+def collection_rows(user, owned_only=True):
+    """Yield (card number, card name, quantity) rows of a user's collection by card number."""
+    entries = CardCollection.objects.filter(user=user)
+    if owned_only:
+        entries = entries.filter(quantity__gte=1)
+    return entries.order_by("card__card_info__number", "card_id") \
+        .values_list("card__card_info__number", "card__card_name", "quantity") \
+        .iterator(chunk_size=CHUNK_SIZE)
+
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def export_collection(rows, fmt):
+    """Yield the encoded rows in `fmt`, CHUNK_SIZE rows at a time."""
+    writer = csv.writer(_Echo())
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def encode(row):
+        if fmt == "csv":
+            return writer.writerow(row)
+        return encoder.encode(dict(zip(COLLECTION_FIELDS, row)))
+
+    yield encode(COLLECTION_FIELDS) if fmt == "csv" else "["
+    lines = []
+    first = True
+    for row in rows:
+        line = encode(row)
+        lines.append(line if fmt == "csv" or first else "," + line)
+        first = False
+        if len(lines) >= CHUNK_SIZE:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+    if fmt == "json":
+        yield "]"
+
+
+def read_collection_file(uploaded, fmt):
+    """
+    Yield (line, number, quantity) from an uploaded file. CSV is parsed row by row as it
+    is read; JSON is decoded whole, which suits collections of a few hundred cards.
+    """
+    if fmt == "csv":
+        text = io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")
+        try:
+            reader = csv.DictReader(text)
+            if not reader.fieldnames or not {"number", "quantity"} <= set(reader.fieldnames):
+                raise CollectionImportError("The CSV header must have 'number' and 'quantity' columns.")
+            for row in reader:
+                yield reader.line_num, row["number"], row["quantity"]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise CollectionImportError(f"Cannot read the CSV file: {e}")
+        finally:
+            text.detach()
+    else:
+        try:
+            rows = json.load(uploaded)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise CollectionImportError(f"Cannot read the JSON file: {e}")
+        if not isinstance(rows, list):
+            raise CollectionImportError("The JSON file must hold a list of {\"number\", \"quantity\"} objects.")
+        for line, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                raise CollectionImportError(f"Entry {line} is not an object.")
+            yield line, row.get("number"), row.get("quantity")
+
+
+def _parse_int(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, int):
+        return value
+    value = str(value if value is not None else "").strip()
+    return int(value) if value else 0
+
+
+def _upsert(user, quantities):
+    CardCollection.objects.bulk_create(
+        [CardCollection(user=user, card_id=card_id, quantity=quantity) for card_id, quantity in quantities.items()],
+        update_conflicts=True, unique_fields=["user", "card"], update_fields=["quantity"],
+    )
+
+
+def import_collection(user, rows, replace=False):
+    """
+    Set the quantities of the cards in `rows` ((line, number, quantity) tuples) and
+    return how many cards were imported. With `replace`, cards missing from the rows
+    are set to zero. Raises CollectionImportError, rolling everything back, on the
+    first bad line.
+    """
+    card_by_number = dict(CardInfo.objects.filter(card__isnull=False).values_list("number", "card_id"))
+    imported = set()
+    with transaction.atomic():
+        if replace:
+            CardCollection.objects.filter(user=user).update(quantity=0)
+        batch = {}
+        for line, number, quantity in rows:
+            try:
+                number = _parse_int(number)
+                quantity = _parse_int(quantity)
+            except ValueError:
+                raise CollectionImportError(f"Line {line}: number and quantity must be whole numbers.")
+            if not 0 <= quantity <= MAX_INTEGER:
+                raise CollectionImportError(f"Line {line}: quantity must be from 0 to {MAX_INTEGER}.")
+            if number not in card_by_number:
+                raise CollectionImportError(f"Line {line}: there is no card number {number}.")
+            batch[card_by_number[number]] = quantity
+            if len(batch) >= CHUNK_SIZE:
+                _upsert(user, batch)
+                imported.update(batch)
+                batch = {}
+        if batch:
+            _upsert(user, batch)
+            imported.update(batch)
+    # Bulk writes send no signals, so stamp the new collection version once committed.
+    bump_collection_version(user.pk)
+    return len(imported)
@@ -0,0 +1,96 @@
+"""
+Streaming bulk export of the card data.
+
+Cards are written in the nested format `load_cards` reads, as NDJSON (one card per
+line) or as a JSON array, with compact separators. Rows are read in chunks with
+their Language, CardImage and CardInfo joined in, and the encoded export is kept in
+the cache under the card data version, so unchanged data is serialized only once.
+"""
+import json
+
+from django.core.cache import cache
+
+from .models import Card
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+EXPORT_CHUNK_SIZE = 500
+EXPORT_TIMEOUT = 60 * 60 * 24
+
+
+def card_record(card):
+    """Return a card in the nested fixture format, without the relations it lacks."""
+    fields = {"card_name": card.card_name}
+    language = getattr(card, "language", None)
+    if language is not None:
+        fields["languages"] = {
+            "Japanese": language.japanese,
+            "Rōmaji": language.romaaji,
+            "Translated": language.translated,
+        }
+    image = getattr(card, "card_image", None)
+    if image is not None:
+        fields["image"] = {
+            "src": image.src,
+            "alt": image.alt,
+            "width": image.width,
+            "height": image.height,
+            "data_file_width": image.data_file_width,
+            "data_file_height": image.data_file_height,
+        }
+    info = getattr(card, "card_info", None)
+    if info is not None:
+        fields["info"] = {
+            "Number": info.number,
+            "ATK/DEF": info.atk_def,
+            "Type": info.card_type,
+            "Rarity": info.rarity,
+            "lore": info.lore,
+        }
+    return {"model": "dm1.card", "pk": card.pk, "fields": fields}
+
+
+def encode_cards(fmt):
+    """Yield the encoded export piece by piece, one chunk of cards at a time."""
+    cards = Card.objects.select_related("language", "card_image", "card_info") \
+        .order_by("card_info__number", "pk").iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    if fmt == "json":
+        yield "["
+    lines = []
+    first = True
+    for card in cards:
+        line = encoder.encode(card_record(card))
+        if fmt == "ndjson":
+            lines.append(line + "\n")
+        else:
+            lines.append(line if first else "," + line)
+        first = False
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+    if fmt == "json":
+        yield "]"
+
+
+def export_cards(fmt, version):
+    """
+    Yield the export as UTF-8 bytes, from the cache when this data version was already
+    encoded; otherwise stream it from the database and cache it once fully written.
+    """
+    key = f"dm1:card_export:{fmt}:{version}"
+    chunks = cache.get(key)
+    if chunks is not None:
+        yield from chunks
+        return
+
+    chunks = []
+    for piece in encode_cards(fmt):
+        chunk = piece.encode("utf-8")
+        chunks.append(chunk)
+        yield chunk
+    cache.set(key, chunks, EXPORT_TIMEOUT)
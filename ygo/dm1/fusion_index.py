@@ -0,0 +1,293 @@
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from .caching import fusion_data_version
+from .models import Card, Fusion, FusionMaterialGroup
+
+
+def to_bitset(card_ids):
+    """Pack card primary keys into an int bitset (bit n set means card pk n is present)."""
+    mask = 0
+    for card_id in card_ids:
+        mask |= 1 << card_id
+    return mask
+
+
+def cards_in(mask):
+    """Return the card pks present in a bitset, lowest first."""
+    card_ids = []
+    while mask:
+        low = mask & -mask
+        card_ids.append(low.bit_length() - 1)
+        mask ^= low
+    return card_ids
+
+
+def lowest_card(mask):
+    """Return the lowest card pk present in a non-empty bitset."""
+    return (mask & -mask).bit_length() - 1
+
+
+class FusionIndex:
+    """
+    In-memory view of every fusion recipe, keyed by unordered card pairs.
+
+    The index is built with a fixed number of queries (cards, fusions, groups and the
+    two material through-tables) no matter how many material groups exist, so a hand
+    lookup never has to touch the database.
+    """
+
+    def __init__(self):
+        self.cards = {}                     # card pk -> {"name", "atk_def", "atk"}
+        self.fusions = {}                   # fusion pk -> {"number", "name", "result_id"}
+        self.pairs = {}                     # (low pk, high pk) -> [(fusion pk, material1 pk, material2 pk)]
+        self.adjacency = defaultdict(set)   # card pk -> pks of every card it can fuse with
+        self.groups = []                    # (fusion pk, material1 bitset, material2 bitset) per group
+        self.result_mask = 0                # bitset of every card that is a fusion result
+        self.data_version = None            # snapshot data version, None when built from the database
+        self._uses = None                   # card pk -> [(fusion pk, partner pks)], see material_uses()
+
+    @classmethod
+    def build(cls):
+        """Load cards, fusions and material groups from the database and index them."""
+        index = cls()
+
+        for pk, name, atk_def, atk in Card.objects.values_list("pk", "card_name", "card_info__atk_def",
+                                                               "card_info__atk"):
+            index.cards[pk] = {"name": name, "atk_def": atk_def or "", "atk": atk or 0}
+
+        for pk, number, name, result_id in Fusion.objects.order_by("pk").values_list(
+                "pk", "number", "name", "result_card_id"):
+            index.fusions[pk] = {"number": number, "name": name, "result_id": result_id}
+            if result_id is not None:
+                index.result_mask |= 1 << result_id
+
+        group_fusion = dict(FusionMaterialGroup.objects.values_list("pk", "fusion_id"))
+        material1 = defaultdict(list)
+        material2 = defaultdict(list)
+        for group_id, card_id in FusionMaterialGroup.material1.through.objects.values_list(
+                "fusionmaterialgroup_id", "card_id"):
+            material1[group_id].append(card_id)
+        for group_id, card_id in FusionMaterialGroup.material2.through.objects.values_list(
+                "fusionmaterialgroup_id", "card_id"):
+            material2[group_id].append(card_id)
+
+        for group_id in sorted(group_fusion):
+            fusion_id = group_fusion[group_id]
+            index.groups.append(
+                (fusion_id, to_bitset(material1.get(group_id, [])), to_bitset(material2.get(group_id, [])))
+            )
+            for m1 in material1.get(group_id, []):
+                for m2 in material2.get(group_id, []):
+                    index.add_pair(fusion_id, m1, m2)
+        return index
+
+    def add_pair(self, fusion_id, material1_id, material2_id):
+        """Register that material1 + material2 (in either order) produce the given fusion."""
+        key = (min(material1_id, material2_id), max(material1_id, material2_id))
+        entries = self.pairs.setdefault(key, [])
+        if any(entry[0] == fusion_id for entry in entries):
+            return
+        entries.append((fusion_id, material1_id, material2_id))
+        self.adjacency[material1_id].add(material2_id)
+        self.adjacency[material2_id].add(material1_id)
+
+    def fusions_for_pair(self, card_a, card_b):
+        """Return the (fusion pk, material1 pk, material2 pk) entries for two cards."""
+        return self.pairs.get((min(card_a, card_b), max(card_a, card_b)), [])
+
+    def fusions_for_hand(self, card_ids):
+        """
+        Return every fusion that can be made from two cards of the hand, one entry per
+        fusion, ordered like the fusion table. Each entry is a dict with "fusion",
+        "material1" and "material2" keys holding primary keys.
+        """
+        found = {}
+        for i, card_a in enumerate(card_ids):
+            partners = self.adjacency.get(card_a)
+            if not partners:
+                continue
+            for card_b in card_ids[i + 1:]:
+                if card_b not in partners:
+                    continue
+                for fusion_id, m1, m2 in self.fusions_for_pair(card_a, card_b):
+                    found.setdefault(fusion_id, {"fusion": fusion_id, "material1": m1, "material2": m2})
+        return [found[fusion_id] for fusion_id in sorted(found)]
+
+    def collection_fusions(self, owned_ids):
+        """
+        Evaluate every material group against a whole collection at once.
+
+        Returns (primary, secondary) lists of dicts with "fusion", "material1",
+        "material2" and "result" primary keys. A primary fusion needs an owned card on
+        both sides of a group. A secondary fusion uses, on one side, a card that can be
+        fused from the collection (directly or through earlier secondary fusions) and an
+        owned card on the other. The lowest pk is picked on each side.
+        """
+        owned = to_bitset(owned_ids)
+
+        primary = []
+        fused = 0
+        for fusion_id, mask1, mask2 in self.groups:
+            owned1 = mask1 & owned
+            owned2 = mask2 & owned
+            if owned1 and owned2:
+                result_id = self.fusions[fusion_id]["result_id"]
+                primary.append({"fusion": fusion_id, "material1": lowest_card(owned1),
+                                "material2": lowest_card(owned2), "result": result_id})
+                if result_id is not None:
+                    fused |= 1 << result_id
+
+        # Grow the set of fusable cards until no group adds a new result.
+        while True:
+            grown = fused
+            for fusion_id, mask1, mask2 in self.groups:
+                result_id = self.fusions[fusion_id]["result_id"]
+                if result_id is None or grown >> result_id & 1:
+                    continue
+                if (mask1 & fused and mask2 & owned) or (mask2 & fused and mask1 & owned):
+                    grown |= 1 << result_id
+            if grown == fused:
+                break
+            fused = grown
+
+        secondary = []
+        for fusion_id, mask1, mask2 in self.groups:
+            result_id = self.fusions[fusion_id]["result_id"]
+            if mask1 & fused and mask2 & owned:
+                secondary.append({"fusion": fusion_id, "material1": lowest_card(mask1 & fused),
+                                  "material2": lowest_card(mask2 & owned), "result": result_id})
+            if mask2 & fused and mask1 & owned:
+                secondary.append({"fusion": fusion_id, "material1": lowest_card(mask1 & owned),
+                                  "material2": lowest_card(mask2 & fused), "result": result_id})
+        return primary, secondary
+
+    def fusion_chains(self, card_ids, memo=None):
+        """
+        Enumerate every fusion chain a hand (or field) can play, in DM1's left-to-right
+        order: two cards fuse, the result fuses with the next card, and so on.
+
+        Returns one chain per reachable final card, strongest ATK first, as dicts with a
+        "result" pk and the "steps" that produce it (dicts with "fusion", "material1",
+        "material2" and "result" pks). When a card is reachable in several ways the
+        shortest chain is kept. Hand states (current card, remaining cards) are memoized,
+        so orderings that lead to the same state are only expanded once; pass the same
+        `memo` dict to share them across hands.
+        """
+        if memo is None:
+            memo = {}
+        best = {}
+        hand = tuple(sorted(card_ids))
+        for i, card_id in enumerate(hand):
+            if card_id not in self.adjacency or (i and hand[i - 1] == card_id):
+                continue
+            for final, steps in self._chains_from(card_id, hand[:i] + hand[i + 1:], memo).items():
+                if final not in best or len(steps) < len(best[final]):
+                    best[final] = steps
+
+        chains = [{"result": final, "steps": list(steps)} for final, steps in best.items()]
+        chains.sort(key=lambda chain: (-self.cards.get(chain["result"], {}).get("atk", 0),
+                                       len(chain["steps"]), chain["result"]))
+        return chains
+
+    def _chains_from(self, current, remaining, memo):
+        """Return {final card pk: steps} for chains continuing from `current` with `remaining` cards."""
+        key = (current, remaining)
+        if key in memo:
+            return memo[key]
+
+        best = {}
+        partners = self.adjacency.get(current, ())
+        for i, card_id in enumerate(remaining):
+            if card_id not in partners or (i and remaining[i - 1] == card_id):
+                continue
+            rest = remaining[:i] + remaining[i + 1:]
+            for fusion_id, _, _ in self.fusions_for_pair(current, card_id):
+                result_id = self.fusions[fusion_id]["result_id"]
+                if result_id is None:
+                    continue
+                step = ({"fusion": fusion_id, "material1": current, "material2": card_id, "result": result_id},)
+                candidates = [(result_id, ())]
+                candidates.extend(self._chains_from(result_id, rest, memo).items())
+                for final, tail in candidates:
+                    steps = step + tail
+                    if final not in best or len(steps) < len(best[final]):
+                        best[final] = steps
+        memo[key] = best
+        return best
+
+    def material_uses(self, card_id):
+        """
+        Return the fusions a card is a material of, as (fusion pk, partner pks) tuples
+        ordered by fusion number, one per material group. The reverse index is built
+        from the material groups on first use and kept with the index.
+        """
+        if self._uses is None:
+            uses = defaultdict(list)
+            for fusion_id, mask1, mask2 in self.groups:
+                for material in cards_in(mask1):
+                    uses[material].append((fusion_id, cards_in(mask2)))
+                for material in cards_in(mask2):
+                    uses[material].append((fusion_id, cards_in(mask1)))
+            for entries in uses.values():
+                entries.sort(key=lambda entry: self.fusions[entry[0]]["number"])
+            self._uses = uses
+        return self._uses.get(card_id, [])
+
+    def result_for(self, fusion_id):
+        """Return the result card pk of a fusion (or None if it has none)."""
+        return self.fusions[fusion_id]["result_id"]
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def _load_index(version):
+    """
+    Build the index from the compiled snapshot when one is configured and was built
+    from fusion data `version`, else from the database.
+    """
+    path = getattr(settings, "FUSION_SNAPSHOT_PATH", None)
+    if path and os.path.exists(path):
+        from .snapshot import SnapshotError, load_snapshot
+        try:
+            index = load_snapshot(path)
+        except SnapshotError:
+            pass
+        else:
+            if index.data_version == version:
+                return index
+    return FusionIndex.build()
+
+
+def get_fusion_index():
+    """
+    Return the process-wide fusion index, building it on first use and again whenever
+    the shared fusion data version moves (a data load in another process).
+
+    The version stamp lives in the 'versions' cache, which must never evict it. If it is
+    lost anyway (the cache was cleared), a new stamp is minted: every worker rebuilds from
+    the database and ignores the snapshot until build_fusion_snapshot is run again.
+    """
+    global _index, _index_version
+    version = fusion_data_version()
+    index = _index
+    if index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = _load_index(version)
+                _index_version = version
+            index = _index
+    return index
+
+
+def invalidate_fusion_index(**kwargs):
+    """Drop the cached index so the next lookup rebuilds it. Usable as a signal receiver."""
+    global _index
+    with _lock:
+        _index = None
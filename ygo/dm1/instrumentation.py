@@ -0,0 +1,165 @@
+"""
+Per-request SQL and latency instrumentation.
+
+QueryMetricsMiddleware wraps every database call made while a request is handled and
+records the query count, total SQL time, duplicate query fingerprints and wall time.
+The numbers are added to the response headers and aggregated per view for the local
+metrics endpoint. Views can declare a query budget with @query_budget(n); with the
+QUERY_BUDGET_STRICT setting on, a request that goes over it raises
+QueryBudgetExceeded, which fails the test that made it.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+MAX_DUPLICATES_PER_VIEW = 20
+
+_IN_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a view runs more queries than its declared budget."""
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may run per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def fingerprint(sql):
+    """Return a short id of a query with its literals and IN-list lengths normalized away."""
+    normalized = _NUMBER.sub("?", _IN_LIST.sub("(...)", sql))
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts and times the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.sql_time = 0.0
+        self.fingerprints = Counter()
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.count += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            self.samples.setdefault(key, sql)
+
+    def duplicates(self):
+        """Return {fingerprint: count} for queries run more than once."""
+        return {key: count for key, count in self.fingerprints.items() if count > 1}
+
+
+class QueryMetrics:
+    """Thread-safe per-view aggregate of the recorded requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, recorder, wall_time):
+        with self._lock:
+            stats = self._views.setdefault(view_name, {
+                "requests": 0,
+                "queries_total": 0,
+                "queries_max": 0,
+                "sql_ms_total": 0.0,
+                "wall_ms_total": 0.0,
+                "wall_ms_max": 0.0,
+                "duplicates": {},
+            })
+            stats["requests"] += 1
+            stats["queries_total"] += recorder.count
+            stats["queries_max"] = max(stats["queries_max"], recorder.count)
+            stats["sql_ms_total"] += recorder.sql_time * 1000
+            stats["wall_ms_total"] += wall_time * 1000
+            stats["wall_ms_max"] = max(stats["wall_ms_max"], wall_time * 1000)
+            for key, count in recorder.duplicates().items():
+                duplicate = stats["duplicates"].get(key)
+                if duplicate is None:
+                    if len(stats["duplicates"]) >= MAX_DUPLICATES_PER_VIEW:
+                        continue
+                    duplicate = stats["duplicates"][key] = {"sql": recorder.samples[key], "count": 0}
+                duplicate["count"] += count
+
+    def snapshot(self):
+        """Return the aggregates with per-request averages, heaviest views first."""
+        with self._lock:
+            views = {}
+            for view_name, stats in self._views.items():
+                requests = stats["requests"]
+                views[view_name] = dict(
+                    stats,
+                    duplicates={key: dict(value) for key, value in stats["duplicates"].items()},
+                    queries_avg=stats["queries_total"] / requests,
+                    sql_ms_avg=stats["sql_ms_total"] / requests,
+                    wall_ms_avg=stats["wall_ms_total"] / requests,
+                )
+        return dict(sorted(views.items(), key=lambda item: -item[1]["queries_avg"]))
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+metrics = QueryMetrics()
+UNRESOLVED = "<unresolved>"
+
+
+def _declared_budget(view_func):
+    budget = getattr(view_func, "query_budget", None)
+    if budget is None and hasattr(view_func, "view_class"):
+        budget = getattr(view_func.view_class, "query_budget", None)
+    return budget
+
+
+class QueryMetricsMiddleware:
+    """Record query count, SQL time, duplicate queries and wall time of every request."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_METRICS", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        wall_time = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        # Unresolved requests (404s) share one entry so arbitrary paths cannot grow the metrics.
+        view_name = (match.view_name or match._func_path) if match else UNRESOLVED
+        metrics.record(view_name, recorder, wall_time)
+
+        response["X-Query-Count"] = str(recorder.count)
+        response["X-Query-Time-Ms"] = f"{recorder.sql_time * 1000:.2f}"
+        response["X-Duplicate-Queries"] = str(sum(count - 1 for count in recorder.duplicates().values()))
+        response["X-Response-Time-Ms"] = f"{wall_time * 1000:.2f}"
+
+        budget = _declared_budget(match.func) if match else None
+        if budget is not None:
+            response["X-Query-Budget"] = str(budget)
+            if recorder.count > budget and getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(
+                    f"{view_name} ran {recorder.count} queries, over its budget of {budget}."
+                )
+        return response
@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from dm1.caching import bump_fusion_data_version
+from dm1.fusion_index import FusionIndex
+from dm1.snapshot import write_snapshot
+
+class Command(BaseCommand):
+    help = ("Compile cards and fusions into the binary snapshot that workers memory-map at startup. "
+            "Re-run it after loading new card or fusion data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", type=str, default=None,
+                            help="Snapshot file to write (defaults to the FUSION_SNAPSHOT_PATH setting)")
+
+    def handle(self, *args, **options):
+        output = options["output"] or settings.FUSION_SNAPSHOT_PATH
+        if not output:
+            raise CommandError("No output file given and FUSION_SNAPSHOT_PATH is not set.")
+
+        start = time.perf_counter()
+        index = FusionIndex.build()
+        # Stamp the snapshot with the new shared version, so workers load it instead of the database.
+        data_version = write_snapshot(index, output, bump_fusion_data_version())
+        elapsed = time.perf_counter() - start
+
+        pair_count = sum(len(entries) for entries in index.pairs.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output} (data version {data_version}): {len(index.cards)} cards, "
+            f"{len(index.fusions)} fusions, {len(index.groups)} material groups, "
+            f"{pair_count} material pairs in {elapsed:.2f}s."
+        ))
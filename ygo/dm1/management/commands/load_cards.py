@@ -1,58 +1,132 @@
 import json
-from django.core.management.base import BaseCommand
-from dm1.models import Card, Language, CardImage, CardInfo
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from dm1.models import Card, Language, CardImage, CardInfo, parse_atk_def
+from dm1.signals import reference_data_changed
+
+LANGUAGE_FIELDS = ["japanese", "romaaji", "translated"]
+IMAGE_FIELDS = ["src", "alt", "width", "height", "data_file_width", "data_file_height"]
+INFO_FIELDS = ["atk_def", "atk", "defense", "card_type", "rarity", "lore"]
+
+
+def read_records(json_file):
+    """Return the card records of a JSON array file, or of an NDJSON file (one card per line)."""
+    with open(json_file, encoding="utf-8") as f:
+        if json_file.endswith(".ndjson"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def card_values(fields):
+    """Split a record's nested fields into (card name, language, image, info) attribute dicts."""
+    lang_data = fields.get("languages") or {}
+    img_data = fields.get("image") or {}
+    info_data = fields.get("info") or {}
+    atk, defense = parse_atk_def(info_data.get("ATK/DEF", ""))
+    return (
+        fields.get("card_name", ""),
+        {
+            "japanese": lang_data.get("Japanese", ""),
+            "romaaji": lang_data.get("Rōmaji", ""),
+            "translated": lang_data.get("Translated", ""),
+        },
+        {
+            "src": img_data.get("src", ""),
+            "alt": img_data.get("alt", ""),
+            "width": int(img_data.get("width", 0)),
+            "height": int(img_data.get("height", 0)),
+            "data_file_width": int(img_data.get("data_file_width", 0)),
+            "data_file_height": int(img_data.get("data_file_height", 0)),
+        },
+        {
+            "atk_def": info_data.get("ATK/DEF", ""),
+            "atk": atk,
+            "defense": defense,
+            "card_type": info_data.get("Type", ""),
+            "rarity": info_data.get("Rarity", ""),
+            "lore": info_data.get("lore", ""),
+        },
+    )
+
 
 class Command(BaseCommand):
-    help = "Load cards from a JSON file"
+    help = "Load cards from a JSON file, updating the cards whose number already exists"
 
     def add_arguments(self, parser):
-        parser.add_argument("json_file", type=str, help="The JSON file to import")
+        parser.add_argument("json_file", type=str, help="The JSON (or NDJSON) file to import")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per INSERT/UPDATE statement")
 
     def handle(self, *args, **options):
-        json_file = options["json_file"]
-        with open(json_file, encoding="utf-8") as f:
-            cards_data = json.load(f)
+        batch_size = options["batch_size"]
+        start = time.perf_counter()
 
-        for card_obj in cards_data:
+        # Key every record on its card number; a number listed twice keeps its last record.
+        records = {}
+        for card_obj in read_records(options["json_file"]):
             fields = card_obj.get("fields", {})
+            try:
+                number = int((fields.get("info") or {})["Number"])
+            except (KeyError, TypeError, ValueError):
+                raise CommandError(f"Card {fields.get('card_name', card_obj.get('pk'))!r} has no card number.")
+            records[number] = card_values(fields)
 
-            # Create the Card instance first
-            card = Card.objects.create(
-                card_name=fields.get("card_name", "")
-            )
+        with transaction.atomic():
+            existing = {
+                info.number: info
+                for info in CardInfo.objects.filter(card__isnull=False).select_related("card__language",
+                                                                                        "card__card_image")
+            }
+            new_numbers = [number for number in records if number not in existing]
 
-            # Create the Language instance, linking it to the Card
-            lang_data = fields.get("languages", {})
-            Language.objects.create(
-                card=card,
-                japanese=lang_data.get("Japanese", ""),
-                romaaji=lang_data.get("Rōmaji", ""),
-                translated=lang_data.get("Translated", "")
+            # Cards first, so the new ones have primary keys for their related rows.
+            new_cards = Card.objects.bulk_create(
+                [Card(card_name=records[number][0]) for number in new_numbers], batch_size=batch_size
             )
+            cards = dict(zip(new_numbers, new_cards))
 
-            # Create the CardImage instance, linking it to the Card
-            img_data = fields.get("image", {})
-            CardImage.objects.create(
-                card=card,
-                src=img_data.get("src", ""),
-                alt=img_data.get("alt", ""),
-                width=int(img_data.get("width", 0)),
-                height=int(img_data.get("height", 0)),
-                data_file_width=int(img_data.get("data_file_width", 0)),
-                data_file_height=int(img_data.get("data_file_height", 0))
-            )
+            updated_cards = []
+            to_create = {Language: [], CardImage: [], CardInfo: []}
+            to_update = {Language: [], CardImage: [], CardInfo: []}
+            for number, (card_name, language, image, info) in records.items():
+                current = existing.get(number)
+                if current is None:
+                    card = cards[number]
+                    to_create[Language].append(Language(card=card, **language))
+                    to_create[CardImage].append(CardImage(card=card, **image))
+                    to_create[CardInfo].append(CardInfo(card=card, number=number, **info))
+                    continue
 
-            # Create the CardInfo instance, linking it to the Card
-            info_data = fields.get("info", {})
-            CardInfo.objects.create(
-                card=card,
-                number=info_data.get("Number", ""),
-                atk_def=info_data.get("ATK/DEF", ""),
-                card_type=info_data.get("Type", ""),
-                rarity=info_data.get("Rarity", ""),
-                lore=info_data.get("lore", "")
-            )
+                # Only rows whose values differ are written, so reloading the same file is cheap.
+                card = current.card
+                if card.card_name != card_name:
+                    card.card_name = card_name
+                    updated_cards.append(card)
+                for model, related, values in ((Language, getattr(card, "language", None), language),
+                                               (CardImage, getattr(card, "card_image", None), image),
+                                               (CardInfo, current, info)):
+                    if related is None:
+                        to_create[model].append(model(card=card, **values))
+                    elif any(getattr(related, field) != value for field, value in values.items()):
+                        for field, value in values.items():
+                            setattr(related, field, value)
+                        to_update[model].append(related)
+
+            for model, objs in to_create.items():
+                model.objects.bulk_create(objs, batch_size=batch_size)
+            Card.objects.bulk_update(updated_cards, ["card_name"], batch_size=batch_size)
+            for model, fields in ((Language, LANGUAGE_FIELDS), (CardImage, IMAGE_FIELDS), (CardInfo, INFO_FIELDS)):
+                model.objects.bulk_update(to_update[model], fields, batch_size=batch_size)
 
-            self.stdout.write(self.style.SUCCESS(f"Loaded card: {fields.get('card_name', 'Unknown')}"))
+        # Bulk writes send no model signals; stamp a new data version so cached pages
+        # and indexes are rebuilt.
+        reference_data_changed()
 
-        self.stdout.write(self.style.SUCCESS("All cards loaded successfully."))
+        elapsed = time.perf_counter() - start
+        written = len(new_cards) + len(updated_cards) + sum(len(objs) for objs in to_create.values()) + \
+            sum(len(objs) for objs in to_update.values())
+        rows = len(records) * 4
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {len(records)} cards ({len(new_cards)} new), {written} of {rows} rows written, "
+            f"in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/sec)."
+        ))
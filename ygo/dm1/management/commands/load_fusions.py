@@ -0,0 +1,97 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from dm1.models import CardInfo, Fusion, FusionMaterialGroup
+from dm1.signals import reference_data_changed
+
+
+def read_fixture(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Command(BaseCommand):
+    help = ("Load fusions and their material groups from the fixtures FusionTransformer writes, "
+            "replacing the recipes of fusions whose number already exists")
+
+    def add_arguments(self, parser):
+        parser.add_argument("fusions_file", type=str, help="Fixture of dm1.fusion objects")
+        parser.add_argument("groups_file", type=str,
+                            help="Fixture of dm1.fusionmaterialgroup objects listing material card numbers")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT statement")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        start = time.perf_counter()
+
+        # Fusions are keyed on their number, which is also their result card's number.
+        fusions = {}
+        fusion_numbers = {}
+        for obj in read_fixture(options["fusions_file"]):
+            fields = obj.get("fields", {})
+            try:
+                number = int(fields["number"])
+            except (KeyError, TypeError, ValueError):
+                raise CommandError(f"Fusion {obj.get('pk')} has no number.")
+            fusions[number] = fields.get("name", "")
+            fusion_numbers[obj.get("pk")] = number
+
+        groups = []
+        for obj in read_fixture(options["groups_file"]):
+            fields = obj.get("fields", {})
+            if fields.get("fusion") not in fusion_numbers:
+                raise CommandError(f"Material group {obj.get('pk')} refers to unknown fusion {fields.get('fusion')}.")
+            groups.append((fusion_numbers[fields["fusion"]], fields.get("material1", []),
+                           fields.get("material2", [])))
+
+        with transaction.atomic():
+            card_by_number = dict(CardInfo.objects.filter(card__isnull=False).values_list("number", "card_id"))
+            unknown = sorted({int(number) for _, material1, material2 in groups for number in material1 + material2
+                              if int(number) not in card_by_number})
+            if unknown:
+                raise CommandError(f"Unknown material card numbers: {unknown}. Load the cards first.")
+
+            existing = {fusion.number: fusion for fusion in Fusion.objects.filter(number__in=fusions)}
+            # Reloaded fusions get their recipes replaced rather than duplicated.
+            FusionMaterialGroup.objects.filter(fusion__in=existing.values()).delete()
+            for number, fusion in existing.items():
+                fusion.name = fusions[number]
+                fusion.result_card_id = card_by_number.get(number)
+            Fusion.objects.bulk_update(existing.values(), ["name", "result_card"], batch_size=batch_size)
+            created = Fusion.objects.bulk_create(
+                [Fusion(number=number, name=name, result_card_id=card_by_number.get(number))
+                 for number, name in fusions.items() if number not in existing],
+                batch_size=batch_size,
+            )
+            fusion_by_number = {**existing, **{fusion.number: fusion for fusion in created}}
+
+            material_groups = FusionMaterialGroup.objects.bulk_create(
+                [FusionMaterialGroup(fusion=fusion_by_number[number]) for number, _, _ in groups],
+                batch_size=batch_size,
+            )
+            material1 = FusionMaterialGroup.material1.through
+            material2 = FusionMaterialGroup.material2.through
+            rows1 = []
+            rows2 = []
+            for group, (_, numbers1, numbers2) in zip(material_groups, groups):
+                # A set per side, as the through tables allow each card once per group.
+                rows1.extend(material1(fusionmaterialgroup_id=group.pk, card_id=card_by_number[number])
+                             for number in sorted({int(number) for number in numbers1}))
+                rows2.extend(material2(fusionmaterialgroup_id=group.pk, card_id=card_by_number[number])
+                             for number in sorted({int(number) for number in numbers2}))
+            material1.objects.bulk_create(rows1, batch_size=batch_size)
+            material2.objects.bulk_create(rows2, batch_size=batch_size)
+
+        # Bulk writes send no model signals; stamp a new data version so the fusion
+        # index and cached pages are rebuilt.
+        reference_data_changed()
+
+        elapsed = time.perf_counter() - start
+        unresolved = sum(1 for number in fusions if number not in card_by_number)
+        if unresolved:
+            self.stdout.write(self.style.WARNING(f"{unresolved} fusions have no result card with their number."))
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {len(fusions)} fusions ({len(created)} new), {len(material_groups)} material groups and "
+            f"{len(rows1) + len(rows2)} material rows in {elapsed:.2f}s."
+        ))
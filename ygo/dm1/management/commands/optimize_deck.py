@@ -0,0 +1,40 @@
+from collections import Counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from dm1.fusion_index import get_fusion_index
+from dm1.optimizer import collection_pool, optimize_deck
+from dm1.simulator import DECK_SIZE
+
+class Command(BaseCommand):
+    help = "Search a user's collection for the deck with the highest expected best-hand ATK"
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", type=str, help="Username whose collection to build the deck from")
+        parser.add_argument("--seconds", type=float, default=10, help="Time budget for the search")
+        parser.add_argument("--deck-size", type=int, default=DECK_SIZE, help="Cards in the deck")
+        parser.add_argument("--samples", type=int, default=2000, help="Sampled hands each deck is scored on")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Parallel searches (default: one per core, 0: a single search in this process)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+
+        index = get_fusion_index()
+        try:
+            result = optimize_deck(index, collection_pool(user, options["deck_size"]), seconds=options["seconds"],
+                                   deck_size=options["deck_size"], samples=options["samples"],
+                                   workers=options["workers"], seed=options["seed"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for card_id, count in sorted(Counter(result["deck"]).items()):
+            card = index.cards.get(card_id, {})
+            self.stdout.write(f"{count} x {card.get('name', card_id)} ({card.get('atk_def', '')})")
+        self.stdout.write(self.style.SUCCESS(
+            f"Expected best ATK {result['expected_best_atk']:.0f} after {result['evaluations']} candidate moves "
+            f"in {result['elapsed']:.1f}s."
+        ))
@@ -0,0 +1,67 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from dm1.benchmarks import run_suite, seed_fixtures, seed_synthetic
+from dm1.caching import LOCAL_CACHES
+
+class Command(BaseCommand):
+    help = ("Benchmark the fusion routines and views on the shipped fixtures and on synthetic datasets, "
+            "using a throwaway test database, and write the results as JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", type=int, nargs="*", default=[10, 100],
+                            help="Synthetic dataset sizes as multiples of the fixtures (default: 10 100)")
+        parser.add_argument("--no-fixtures", action="store_true", help="Skip the dataset seeded from the fixtures")
+        parser.add_argument("--repeat", type=int, default=10, help="Runs per benchmark")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for datasets and hands")
+        parser.add_argument("--output", type=str, default="benchmarks.json", help="JSON file to write")
+
+    def handle(self, *args, **options):
+        seeders = [] if options["no_fixtures"] else [seed_fixtures]
+        seeders += [lambda scale=scale: seed_synthetic(scale, seed=options["seed"]) for scale in options["scales"]]
+
+        results = []
+        setup_test_environment()
+        # A private cache, so the throwaway data's version stamps and cached pages never
+        # reach workers sharing the configured cache.
+        local_cache = override_settings(CACHES=LOCAL_CACHES)
+        local_cache.enable()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for seeder in seeders:
+                call_command("flush", interactive=False, verbosity=0)
+                dataset = seeder()
+                self.stdout.write(f"Benchmarking {dataset}...")
+                for result in run_suite(dataset, repeat=options["repeat"], seed=options["seed"]):
+                    results.append(result)
+                    self.stdout.write(f"  {result['name']:<36} {result['median_ms']:10.2f} ms  "
+                                      f"{result['queries']:6d} queries")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            local_cache.disable()
+            teardown_test_environment()
+
+        report = {
+            "commit": self.git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "repeat": options["repeat"],
+            "results": results,
+        }
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
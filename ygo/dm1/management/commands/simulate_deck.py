@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from dm1.fusion_index import get_fusion_index
+from dm1.simulator import DECK_SIZE, HAND_SIZE, deck_from_collection, simulate
+
+class Command(BaseCommand):
+    help = "Draw random hands from a deck and report the ATK of the strongest monster each hand can field"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=str, help="Build the deck from this user's collection")
+        parser.add_argument("--deck", type=str, help="Comma-separated card IDs to use as the deck instead")
+        parser.add_argument("--deck-size", type=int, default=DECK_SIZE, help="Cards taken from the collection")
+        parser.add_argument("--hands", type=int, default=1_000_000, help="Number of hands to draw")
+        parser.add_argument("--hand-size", type=int, default=HAND_SIZE, help="Cards per hand")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (results are reproducible per seed)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: one per core, 0: run in this process)")
+        parser.add_argument("--batch-size", type=int, default=10_000, help="Hands per worker batch")
+        parser.add_argument("--threshold", type=int, default=2000, help="Fusion ATK to report the odds of")
+
+    def handle(self, *args, **options):
+        if options["deck"]:
+            deck = [int(card_id) for card_id in options["deck"].split(",") if card_id.strip()]
+        elif options["user"]:
+            try:
+                user = get_user_model().objects.get(username=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+            deck = deck_from_collection(user, size=options["deck_size"])
+        else:
+            raise CommandError("Pass --user or --deck.")
+
+        try:
+            report = simulate(get_fusion_index(), deck, options["hands"], hand_size=options["hand_size"],
+                              seed=options["seed"], workers=options["workers"],
+                              batch_size=options["batch_size"], threshold=options["threshold"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Deck: {len(deck)} cards, {report['hands']} hands, seed {report['seed']}")
+        self.stdout.write("Best monster ATK distribution:")
+        for atk, count in report["best_atk"].items():
+            self.stdout.write(f"  {atk:>5}: {count / report['hands']:7.2%}")
+        self.stdout.write(f"Mean best ATK: {report['mean_best_atk']:.0f}")
+        self.stdout.write(f"Hands with a fusion: {report['fusion_rate']:.2%}")
+        self.stdout.write(f"Hands with a fusion of {report['threshold']}+ ATK: {report['threshold_rate']:.2%}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Simulated {report['hands']} hands in {report['elapsed']:.2f}s ({report['hands_per_sec']:.0f} hands/sec)."
+        ))
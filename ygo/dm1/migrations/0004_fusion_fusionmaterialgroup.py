@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2025-03-02 14:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dm1', '0003_remove_card_image_remove_card_info_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cardinfo',
+            name='number',
+            field=models.PositiveIntegerField(verbose_name='Number'),
+        ),
+        migrations.CreateModel(
+            name='Fusion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Fusion Number')),
+                ('name', models.CharField(max_length=255, verbose_name='Fusion Name')),
+                ('result_card', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fusion_result', to='dm1.card', verbose_name='Fusion Result Card')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FusionMaterialGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fusion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='material_groups', to='dm1.fusion', verbose_name='Fusion Recipe')),
+                ('material1', models.ManyToManyField(blank=True, related_name='fusion_material1', to='dm1.card', verbose_name='Material 1 Cards')),
+                ('material2', models.ManyToManyField(blank=True, related_name='fusion_material2', to='dm1.card', verbose_name='Material 2 Cards')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CardCollection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=0, help_text='Number of this card owned.', verbose_name='Quantity Owned')),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_entry', to='dm1.card', verbose_name='Card')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='card_collection', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'card')},
+            },
+        ),
+    ]
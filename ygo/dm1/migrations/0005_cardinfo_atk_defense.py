@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+def parse_stats(apps, schema_editor):
+    # Historical models have no custom save(), so fill the new columns here.
+    CardInfo = apps.get_model('dm1', 'CardInfo')
+    infos = list(CardInfo.objects.only('atk_def'))
+    for info in infos:
+        stats = []
+        for part in (info.atk_def or '').split('/')[:2]:
+            try:
+                stats.append(int(part))
+            except ValueError:
+                stats.append(None)
+        info.atk, info.defense = stats + [None] * (2 - len(stats))
+    CardInfo.objects.bulk_update(infos, ['atk', 'defense'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dm1', '0004_fusion_fusionmaterialgroup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardinfo',
+            name='atk',
+            field=models.IntegerField(blank=True, db_index=True, null=True, verbose_name='ATK'),
+        ),
+        migrations.AddField(
+            model_name='cardinfo',
+            name='defense',
+            field=models.IntegerField(blank=True, db_index=True, null=True, verbose_name='DEF'),
+        ),
+        migrations.AlterField(
+            model_name='cardinfo',
+            name='number',
+            field=models.PositiveIntegerField(db_index=True, verbose_name='Number'),
+        ),
+        migrations.RunPython(parse_stats, migrations.RunPython.noop),
+    ]
@@ -31,14 +31,33 @@ class CardImage(models.Model):
         return self.alt
 
 
+def parse_atk_def(atk_def):
+    """Return (ATK, DEF) as ints from an "ATK / DEF" string, None for a missing or unreadable side."""
+    values = []
+    for part in (atk_def or "").split("/")[:2]:
+        try:
+            values.append(int(part))
+        except ValueError:
+            values.append(None)
+    values += [None] * (2 - len(values))
+    return tuple(values)
+
+
 class CardInfo(models.Model):
     card = models.OneToOneField(Card, on_delete=models.CASCADE, related_name="card_info", null=True, blank=True)
-    number = models.PositiveIntegerField("Number")
+    number = models.PositiveIntegerField("Number", db_index=True)
     atk_def = models.CharField("ATK/DEF", max_length=50)
+    # Parsed from atk_def on save, so sorting and ranking can use an index.
+    atk = models.IntegerField("ATK", null=True, blank=True, db_index=True)
+    defense = models.IntegerField("DEF", null=True, blank=True, db_index=True)
     card_type = models.CharField("Type", max_length=50)
     rarity = models.CharField("Rarity", max_length=10)
     lore = models.TextField("Lore")
 
+    def save(self, *args, **kwargs):
+        self.atk, self.defense = parse_atk_def(self.atk_def)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.number} - {self.rarity}"
 
@@ -86,6 +105,10 @@ class FusionMaterialGroup(models.Model):
         return f"{self.fusion} | Material1: {m1} | Material2: {m2}"
 
 
+# The largest value an integer column (ids, quantities) holds on every database backend.
+MAX_INTEGER = 2**31 - 1
+
+
 class CardCollection(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='card_collection')
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name='collection_entry', verbose_name="Card")
@@ -0,0 +1,64 @@
+import threading
+
+from django.db.models import F
+
+from .caching import reference_data_version
+from .models import Card, Fusion
+
+
+class NeighborIndex:
+    """Previous/next lookup over an ordered list of (pk, label) rows, in O(1) per page."""
+
+    def __init__(self, rows):
+        self.neighbors = {}
+        rows = [{"pk": pk, "name": name} for pk, name in rows]
+        for i, row in enumerate(rows):
+            prev_row = rows[i - 1] if i > 0 else None
+            next_row = rows[i + 1] if i + 1 < len(rows) else None
+            self.neighbors[row["pk"]] = (prev_row, next_row)
+
+    def around(self, pk):
+        """Return (previous, next) as {"pk", "name"} dicts, None at either end."""
+        return self.neighbors.get(pk, (None, None))
+
+
+def _card_rows():
+    return Card.objects.order_by(F("card_info__number").asc(nulls_last=True), "pk").values_list("pk", "card_name")
+
+
+def _fusion_rows():
+    return Fusion.objects.order_by("number", "pk").values_list("pk", "name")
+
+
+_builders = {"cards": _card_rows, "fusions": _fusion_rows}
+_indexes = {}                       # name -> (reference data version, NeighborIndex)
+_lock = threading.Lock()
+
+
+def _get(name):
+    # Rebuilt when the shared data version moves, so loads in other processes are seen too.
+    version = reference_data_version()
+    built_version, index = _indexes.get(name, (None, None))
+    if index is None or built_version != version:
+        with _lock:
+            built_version, index = _indexes.get(name, (None, None))
+            if index is None or built_version != version:
+                index = NeighborIndex(_builders[name]())
+                _indexes[name] = (version, index)
+    return index
+
+
+def card_neighbors(pk):
+    """Return the (previous, next) cards by card number."""
+    return _get("cards").around(pk)
+
+
+def fusion_neighbors(pk):
+    """Return the (previous, next) fusions by fusion number."""
+    return _get("fusions").around(pk)
+
+
+def invalidate_navigation(**kwargs):
+    """Drop the cached neighbor indexes so the next page view rebuilds them."""
+    with _lock:
+        _indexes.clear()
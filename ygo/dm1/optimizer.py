@@ -0,0 +1,140 @@
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from .models import CardCollection
+from .simulator import DECK_SIZE, HAND_SIZE, HandEvaluator, worker_context
+
+
+def collection_pool(user, deck_size=DECK_SIZE):
+    """
+    Return {card pk: usable quantity} for every card the user owns. A deck holds at
+    most `deck_size` copies of a card, so larger quantities are clamped to that.
+    """
+    entries = CardCollection.objects.filter(user=user, quantity__gte=1).values_list('card_id', 'quantity')
+    return {card_id: min(quantity, deck_size) for card_id, quantity in entries}
+
+
+class DeckSearch:
+    """
+    Hill-climbing search for the deck with the highest expected best-hand ATK.
+
+    A deck is scored on a fixed sample of hands, each hand being a set of deck slots.
+    Swapping the card in one slot only changes the hands that contain that slot, so a
+    candidate move re-scores roughly samples * hand_size / deck_size hands instead of
+    re-simulating the whole deck.
+    """
+
+    def __init__(self, evaluator, pool, deck_size=DECK_SIZE, hand_size=HAND_SIZE, samples=2000, sample_seed=0):
+        self.evaluator = evaluator
+        # initial_deck() lists every copy, so never more copies than fit in a deck.
+        self.pool = {card_id: min(quantity, deck_size) for card_id, quantity in pool.items()}
+        self.deck_size = deck_size
+        rng = random.Random(sample_seed)
+        self.hands = [tuple(rng.sample(range(deck_size), hand_size)) for _ in range(samples)]
+        self.hands_by_slot = [[] for _ in range(deck_size)]
+        for hand_index, slots in enumerate(self.hands):
+            for slot in slots:
+                self.hands_by_slot[slot].append(hand_index)
+
+    def score_hand(self, deck, slots):
+        return self.evaluator.evaluate([deck[slot] for slot in slots])[1]
+
+    def initial_deck(self, rng=None):
+        """Strongest owned copies first, or a random selection of owned copies when given an RNG."""
+        copies = [card_id for card_id, quantity in self.pool.items() for _ in range(quantity)]
+        if rng is None:
+            copies.sort(key=lambda card_id: (-self.evaluator.atk(card_id), card_id))
+        else:
+            rng.shuffle(copies)
+        return copies[:self.deck_size]
+
+    def run(self, deck, deadline, rng):
+        """Improve `deck` until `deadline` (time.monotonic()) and return (deck, score, evaluations)."""
+        deck = list(deck)
+        used = Counter(deck)
+        candidates = [card_id for card_id in self.pool if self.pool[card_id] > 0]
+        scores = [self.score_hand(deck, slots) for slots in self.hands]
+        total = sum(scores)
+        evaluations = 0
+
+        while time.monotonic() < deadline:
+            slot = rng.randrange(self.deck_size)
+            new_card = rng.choice(candidates)
+            old_card = deck[slot]
+            if new_card == old_card or used[new_card] >= self.pool[new_card]:
+                continue
+
+            deck[slot] = new_card
+            changed = [(hand_index, self.score_hand(deck, self.hands[hand_index]))
+                       for hand_index in self.hands_by_slot[slot]]
+            delta = sum(score - scores[hand_index] for hand_index, score in changed)
+            evaluations += 1
+            if delta >= 0:
+                for hand_index, score in changed:
+                    scores[hand_index] = score
+                total += delta
+                used[old_card] -= 1
+                used[new_card] += 1
+            else:
+                deck[slot] = old_card
+
+        return sorted(deck), total / len(self.hands), evaluations
+
+
+_worker_evaluator = None
+
+
+def _init_worker(index):
+    global _worker_evaluator
+    _worker_evaluator = HandEvaluator(index)
+
+
+def _search(pool, deck_size, hand_size, samples, seed, restart, seconds):
+    """Run one search; restart 0 starts from the strongest deck, the others from random decks."""
+    deadline = time.monotonic() + seconds
+    search = DeckSearch(_worker_evaluator, pool, deck_size=deck_size, hand_size=hand_size, samples=samples,
+                        sample_seed=seed)
+    rng = random.Random(seed * 1_000_003 + restart)
+    deck = search.initial_deck(rng if restart else None)
+    return search.run(deck, deadline, rng)
+
+
+def optimize_deck(index, pool, seconds=10, deck_size=DECK_SIZE, hand_size=HAND_SIZE, samples=2000, workers=None,
+                  seed=0):
+    """
+    Pick `deck_size` cards out of `pool` ({card pk: quantity}) to maximize the expected
+    ATK of the strongest monster an opening hand can field.
+
+    One search per worker runs for `seconds` (`workers=None` uses every core,
+    `workers=0` runs a single search in this process). All searches score decks on the
+    same sampled hands, so their results are comparable and the best one is returned
+    as a dict with the sorted deck, its expected best ATK, the number of candidate
+    moves evaluated and the elapsed time.
+    """
+    owned = sum(pool.values())
+    if owned < deck_size:
+        raise ValueError(f"A deck needs {deck_size} cards, the collection only has {owned}.")
+
+    start = time.perf_counter()
+    if workers == 0:
+        _init_worker(index)
+        results = [_search(pool, deck_size, hand_size, samples, seed, 0, seconds)]
+    else:
+        restarts = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=restarts, mp_context=worker_context(), initializer=_init_worker,
+                                 initargs=(index,)) as executor:
+            futures = [executor.submit(_search, pool, deck_size, hand_size, samples, seed, restart, seconds)
+                       for restart in range(restarts)]
+            results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    deck, score, _ = max(results, key=lambda result: result[1])
+    return {
+        "deck": deck,
+        "expected_best_atk": score,
+        "evaluations": sum(result[2] for result in results),
+        "elapsed": elapsed,
+    }
@@ -0,0 +1,112 @@
+"""
+Keyset pagination over (number, pk).
+
+Pages are addressed by the key of the row they start after (or end before) instead of
+an offset, so fetching any page is one indexed range query for page size + 1 rows,
+however deep into the list it is. Cursors are "<number>-<pk>" strings. Rows without a
+number (a card with no CardInfo) come after all numbered rows, ordered by pk, with
+"null-<pk>" cursors.
+"""
+from django.core.exceptions import BadRequest
+from django.db.models import F, Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class KeysetPage:
+    def __init__(self, items, size, next_cursor, prev_cursor):
+        self.items = items
+        self.size = size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def cursor_for(obj):
+    number = "null" if obj.keyset_number is None else obj.keyset_number
+    return f"{number}-{obj.pk}"
+
+
+def parse_cursor(value):
+    """Return (number or None, pk) for a cursor string; raise BadRequest (400) for a malformed one."""
+    try:
+        number, pk = value.split("-")
+        number = None if number == "null" else int(number)
+        pk = int(pk)
+    except ValueError:
+        raise BadRequest(f"Invalid page cursor {value!r}.")
+    if pk < 1 or (number is not None and number < 0):
+        raise BadRequest(f"Invalid page cursor {value!r}.")
+    return number, pk
+
+
+def page_size(request, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(request.GET.get("size", default))
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_paginate(queryset, number_field, request, default_size=DEFAULT_PAGE_SIZE):
+    """
+    Return the KeysetPage of `queryset` ordered by (`number_field`, pk), NULL numbers
+    last, selected by the request's `after`/`before` cursor and `size` parameters.
+    """
+    size = page_size(request, default_size)
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    queryset = queryset.annotate(keyset_number=F(number_field))
+
+    numbered = Q(**{f"{number_field}__isnull": False})
+    unnumbered = Q(**{f"{number_field}__isnull": True})
+    if before:
+        number, pk = parse_cursor(before)
+        if number is None:
+            queryset = queryset.filter(numbered | (unnumbered & Q(pk__lt=pk)))
+        else:
+            queryset = queryset.filter(Q(**{f"{number_field}__lt": number}) | Q(**{number_field: number, "pk__lt": pk}))
+        queryset = queryset.order_by(F(number_field).desc(nulls_first=True), "-pk")
+    else:
+        if after:
+            number, pk = parse_cursor(after)
+            if number is None:
+                queryset = queryset.filter(unnumbered & Q(pk__gt=pk))
+            else:
+                queryset = queryset.filter(Q(**{f"{number_field}__gt": number}) |
+                                           Q(**{number_field: number, "pk__gt": pk}) | unnumbered)
+        queryset = queryset.order_by(F(number_field).asc(nulls_last=True), "pk")
+
+    # One extra row tells whether another page follows in the direction of travel.
+    items = list(queryset[:size + 1])
+    more = len(items) > size
+    items = items[:size]
+    if before:
+        items.reverse()
+        has_next, has_previous = True, more
+    else:
+        has_next, has_previous = more, bool(after)
+
+    return KeysetPage(
+        items,
+        size,
+        cursor_for(items[-1]) if items and has_next else None,
+        cursor_for(items[0]) if items and has_previous else None,
+    )
+
+
+def page_links(request, page):
+    """Return the (next, previous) URLs of a page, keeping its size."""
+    def link(direction, cursor):
+        if cursor is None:
+            return None
+        return request.build_absolute_uri(f"{request.path}?{direction}={cursor}&size={page.size}")
+    return link("after", page.next_cursor), link("before", page.prev_cursor)
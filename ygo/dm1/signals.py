@@ -0,0 +1,48 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .caching import bump_card_data_version, bump_collection_version, bump_fusion_data_version
+from .card_search import invalidate_card_search_index
+from .fusion_index import invalidate_fusion_index
+from .models import Card, CardCollection, CardImage, CardInfo, Fusion, FusionMaterialGroup, Language
+from .navigation import invalidate_navigation
+
+
+def fusion_data_changed(**kwargs):
+    """Rebuild the in-memory card and fusion data and drop results computed from it."""
+    invalidate_fusion_index()
+    invalidate_navigation()
+    bump_fusion_data_version()
+
+
+def card_data_changed(**kwargs):
+    """Drop the card search index and exports rendered from the card data."""
+    invalidate_card_search_index()
+    bump_card_data_version()
+
+
+def reference_data_changed(**kwargs):
+    """
+    Drop everything derived from the card and fusion data. Loaders call this once
+    they are done, as bulk writes send no model signals.
+    """
+    fusion_data_changed()
+    card_data_changed()
+
+
+def collection_changed(sender, instance, **kwargs):
+    """Drop the cached deck fusion results of the collection's owner."""
+    bump_collection_version(instance.user_id)
+
+
+def connect_signals():
+    """Keep the in-memory fusion data and cached results in step with the database."""
+    for model in (Card, CardInfo, Fusion, FusionMaterialGroup):
+        post_save.connect(fusion_data_changed, sender=model, dispatch_uid=f"fusion_data_save_{model.__name__}")
+        post_delete.connect(fusion_data_changed, sender=model, dispatch_uid=f"fusion_data_delete_{model.__name__}")
+    for model in (Card, Language, CardImage, CardInfo):
+        post_save.connect(card_data_changed, sender=model, dispatch_uid=f"card_data_save_{model.__name__}")
+        post_delete.connect(card_data_changed, sender=model, dispatch_uid=f"card_data_delete_{model.__name__}")
+    for through in (FusionMaterialGroup.material1.through, FusionMaterialGroup.material2.through):
+        m2m_changed.connect(fusion_data_changed, sender=through, dispatch_uid=f"fusion_data_m2m_{through.__name__}")
+    post_save.connect(collection_changed, sender=CardCollection, dispatch_uid="collection_save")
+    post_delete.connect(collection_changed, sender=CardCollection, dispatch_uid="collection_delete")
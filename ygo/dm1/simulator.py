@@ -0,0 +1,160 @@
+import multiprocessing
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db.models import F
+
+from .models import CardCollection
+
+DECK_SIZE = 40
+HAND_SIZE = 5
+MEMO_LIMIT = 1_000_000
+
+
+class HandEvaluator:
+    """
+    Scores hands by the strongest monster they can put on the field: the best fusion
+    chain result, or the strongest card in hand when nothing fuses.
+
+    Chains come from FusionIndex.fusion_chains(). Whole hands and chain states
+    (current card, remaining cards) are memoized across hands, so decks that keep
+    producing the same hands get cheaper as the run goes on.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.memo = {}
+        self.hand_memo = {}
+
+    def atk(self, card_id):
+        card = self.index.cards.get(card_id)
+        return card["atk"] if card else 0
+
+    def best_fusion_atk(self, hand):
+        """Return the highest ATK any fusion chain of the hand produces (0 when none)."""
+        if len(self.memo) > MEMO_LIMIT:
+            self.memo.clear()
+        # Chains come strongest first.
+        chains = self.index.fusion_chains(hand, self.memo)
+        return self.atk(chains[0]["result"]) if chains else 0
+
+    def evaluate(self, hand):
+        """Return (best fusion ATK, best monster ATK) for a hand."""
+        key = tuple(sorted(hand))
+        result = self.hand_memo.get(key)
+        if result is None:
+            if len(self.hand_memo) > MEMO_LIMIT:
+                self.hand_memo.clear()
+            fusion_atk = self.best_fusion_atk(key)
+            result = fusion_atk, max(fusion_atk, max(self.atk(card_id) for card_id in key))
+            self.hand_memo[key] = result
+        return result
+
+
+def deck_from_collection(user, size=DECK_SIZE):
+    """
+    Build a deck from a user's collection: every owned copy, strongest ATK first,
+    cut down to `size` cards.
+    """
+    entries = CardCollection.objects.filter(user=user, quantity__gte=1) \
+        .order_by(F('card__card_info__atk').desc(nulls_last=True), 'card_id') \
+        .values_list('card_id', 'quantity')
+    copies = []
+    for card_id, quantity in entries:
+        # Only the copies that still fit, so a huge quantity never builds a huge list.
+        copies.extend([card_id] * min(quantity, size - len(copies)))
+        if len(copies) >= size:
+            break
+    return copies
+
+
+def worker_context():
+    """
+    Return the multiprocessing context for worker pools. Forked workers inherit the
+    configured Django app registry, which unpickling the fusion index needs.
+    """
+    return multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+
+
+_worker_evaluator = None
+
+
+def _init_worker(index):
+    global _worker_evaluator
+    _worker_evaluator = HandEvaluator(index)
+
+
+def _run_batch(deck, hand_size, count, seed, threshold):
+    """Draw `count` hands with a seeded RNG and tally their results."""
+    evaluator = _worker_evaluator
+    rng = random.Random(seed)
+    best_atk = Counter()
+    fusions = 0
+    strong_fusions = 0
+    for _ in range(count):
+        fusion_atk, monster_atk = evaluator.evaluate(rng.sample(deck, hand_size))
+        best_atk[monster_atk] += 1
+        if fusion_atk:
+            fusions += 1
+            if fusion_atk >= threshold:
+                strong_fusions += 1
+    return best_atk, fusions, strong_fusions
+
+
+def simulate(index, deck, hands, hand_size=HAND_SIZE, seed=0, workers=None, batch_size=10_000, threshold=2000):
+    """
+    Draw `hands` random hands from `deck` and report how strong they are.
+
+    Batches are spread over a ProcessPoolExecutor (`workers=None` uses every core,
+    `workers=0` runs in this process). Batch n is always seeded with `seed + n`, so
+    results only depend on the seed and batch size, not on the number of workers.
+
+    Returns a dict with the hand count, elapsed seconds, hands/sec, the best-monster
+    ATK distribution, its mean, the fusion rate and the rate of fusions reaching
+    `threshold` ATK.
+    """
+    if len(deck) < hand_size:
+        raise ValueError(f"A deck needs at least {hand_size} cards, got {len(deck)}.")
+    if hands < 0:
+        raise ValueError(f"The number of hands cannot be negative, got {hands}.")
+    if batch_size < 1:
+        raise ValueError(f"The batch size must be at least 1, got {batch_size}.")
+
+    batches = []
+    remaining = hands
+    while remaining > 0:
+        count = min(batch_size, remaining)
+        batches.append((deck, hand_size, count, seed + len(batches), threshold))
+        remaining -= count
+
+    start = time.perf_counter()
+    if workers == 0:
+        _init_worker(index)
+        results = [_run_batch(*batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(), initializer=_init_worker,
+                                 initargs=(index,)) as executor:
+            results = list(executor.map(_run_batch, *zip(*batches)))
+    elapsed = time.perf_counter() - start
+
+    best_atk = Counter()
+    fusions = 0
+    strong_fusions = 0
+    for batch_atk, batch_fusions, batch_strong in results:
+        best_atk.update(batch_atk)
+        fusions += batch_fusions
+        strong_fusions += batch_strong
+
+    return {
+        "hands": hands,
+        "seed": seed,
+        "elapsed": elapsed,
+        "hands_per_sec": hands / elapsed if elapsed else 0.0,
+        "best_atk": dict(sorted(best_atk.items())),
+        "mean_best_atk": sum(atk * count for atk, count in best_atk.items()) / hands if hands else 0.0,
+        "fusion_rate": fusions / hands if hands else 0.0,
+        "threshold": threshold,
+        "threshold_rate": strong_fusions / hands if hands else 0.0,
+    }
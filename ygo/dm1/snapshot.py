@@ -0,0 +1,164 @@
+"""
+Compact binary snapshot of the fusion index.
+
+The file holds a fixed header followed by little-endian uint32/int32 columns and a
+UTF-8 string blob:
+
+    header     magic, format version, data version and the section counts
+    cards      pk, atk, name offset, name length, ATK/DEF offset, ATK/DEF length
+    fusions    pk, number, result pk (0 = none), name offset, name length
+    groups     fusion pk, material1 offset, material1 length, material2 offset, material2 length
+    materials  card pks referenced by the group offsets
+    pairs      low pk, high pk, fusion pk, material1 pk, material2 pk, sorted by (low, high)
+    strings    UTF-8 text referenced by the card and fusion offsets
+
+Each worker memory-maps the file read-only and decodes its own FusionIndex from it,
+so startup costs no database queries and the file's pages are shared through the page
+cache. The decoded dicts and sets are ordinary Python objects private to each worker;
+only the file is shared, not the parsed index.
+
+The data version is the fusion data version current when the snapshot was built;
+get_fusion_index() ignores a snapshot whose version no longer matches.
+"""
+import mmap
+import os
+import struct
+import time
+
+from .fusion_index import FusionIndex, cards_in, to_bitset
+
+MAGIC = b"DM1FUSN\0"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIQIIIIII")
+
+CARD_COLUMNS = 6
+FUSION_COLUMNS = 5
+GROUP_COLUMNS = 5
+PAIR_COLUMNS = 5
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, truncated or in an unknown format."""
+
+
+def write_snapshot(index, path, data_version=None):
+    """Write a FusionIndex to `path` and return the data version stamped into it."""
+    data_version = data_version or time.time_ns()
+    strings = bytearray()
+
+    def add_string(text):
+        encoded = (text or "").encode("utf-8")
+        offset = len(strings)
+        strings.extend(encoded)
+        return offset, len(encoded)
+
+    card_rows = []
+    for pk in sorted(index.cards):
+        card = index.cards[pk]
+        card_rows.append((pk, card["atk"]) + add_string(card["name"]) + add_string(card["atk_def"]))
+
+    fusion_rows = []
+    for pk in sorted(index.fusions):
+        fusion = index.fusions[pk]
+        fusion_rows.append((pk, fusion["number"], fusion["result_id"] or 0) + add_string(fusion["name"]))
+
+    materials = []
+    group_rows = []
+    for fusion_id, mask1, mask2 in index.groups:
+        material1 = cards_in(mask1)
+        material2 = cards_in(mask2)
+        group_rows.append((fusion_id, len(materials), len(material1), len(materials) + len(material1),
+                           len(material2)))
+        materials.extend(material1 + material2)
+
+    pair_rows = []
+    for (low, high), entries in sorted(index.pairs.items()):
+        for fusion_id, material1, material2 in entries:
+            pair_rows.append((low, high, fusion_id, material1, material2))
+
+    def columns(rows, width, signed=()):
+        data = bytearray()
+        for column in range(width):
+            fmt = "i" if column in signed else "I"
+            data.extend(struct.pack(f"<{len(rows)}{fmt}", *(row[column] for row in rows)))
+        return data
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, data_version, len(card_rows), len(fusion_rows),
+                         len(group_rows), len(materials), len(pair_rows), len(strings))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(columns(card_rows, CARD_COLUMNS, signed=(1,)))
+        f.write(columns(fusion_rows, FUSION_COLUMNS))
+        f.write(columns(group_rows, GROUP_COLUMNS))
+        f.write(struct.pack(f"<{len(materials)}I", *materials))
+        f.write(columns(pair_rows, PAIR_COLUMNS))
+        f.write(strings)
+    # Replace atomically so running workers never map a half-written file.
+    os.replace(tmp_path, path)
+    return data_version
+
+
+def load_snapshot(path):
+    """Memory-map a snapshot file read-only and build a FusionIndex from it."""
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Cannot map fusion snapshot {path}: {e}") from e
+
+    try:
+        return _read(mm)
+    except struct.error as e:
+        raise SnapshotError(f"Truncated fusion snapshot {path}") from e
+    finally:
+        mm.close()
+
+
+def _read(mm):
+    magic, format_version, data_version, n_cards, n_fusions, n_groups, n_materials, n_pairs, n_strings = \
+        HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported fusion snapshot format {magic!r} v{format_version}")
+
+    offset = HEADER.size
+
+    def read_columns(count, width, signed=()):
+        nonlocal offset
+        result = []
+        for column in range(width):
+            fmt = "i" if column in signed else "I"
+            result.append(struct.unpack_from(f"<{count}{fmt}", mm, offset))
+            offset += 4 * count
+        return result
+
+    cards = read_columns(n_cards, CARD_COLUMNS, signed=(1,))
+    fusions = read_columns(n_fusions, FUSION_COLUMNS)
+    groups = read_columns(n_groups, GROUP_COLUMNS)
+    materials = struct.unpack_from(f"<{n_materials}I", mm, offset)
+    offset += 4 * n_materials
+    pairs = read_columns(n_pairs, PAIR_COLUMNS)
+    strings = mm[offset:offset + n_strings]
+    if len(strings) != n_strings:
+        raise struct.error("string blob is truncated")
+
+    def text(start, length):
+        return strings[start:start + length].decode("utf-8")
+
+    index = FusionIndex()
+    index.data_version = data_version
+    for pk, atk, name_off, name_len, atk_def_off, atk_def_len in zip(*cards):
+        index.cards[pk] = {"name": text(name_off, name_len), "atk_def": text(atk_def_off, atk_def_len), "atk": atk}
+    for pk, number, result_id, name_off, name_len in zip(*fusions):
+        index.fusions[pk] = {"number": number, "name": text(name_off, name_len), "result_id": result_id or None}
+        if result_id:
+            index.result_mask |= 1 << result_id
+    for fusion_id, m1_off, m1_len, m2_off, m2_len in zip(*groups):
+        index.groups.append((fusion_id, to_bitset(materials[m1_off:m1_off + m1_len]),
+                             to_bitset(materials[m2_off:m2_off + m2_len])))
+    for low, high, fusion_id, material1, material2 in zip(*pairs):
+        index.pairs.setdefault((low, high), []).append((fusion_id, material1, material2))
+        index.adjacency[material1].add(material2)
+        index.adjacency[material2].add(material1)
+    return index
+
@@ -1,12 +1,45 @@
 # dm1/tests.py
 
-from django.test import TestCase
+import json
+import os
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Card, CardInfo, CardCollection, Fusion, FusionMaterialGroup
+from .benchmarks import run_suite, seed_fixtures, seed_synthetic
+from .caching import LOCAL_CACHES, bump_fusion_data_version, collection_version, fusion_data_version
+from .fusion_index import FusionIndex, get_fusion_index
+from .instrumentation import UNRESOLVED, QueryBudgetExceeded, fingerprint, metrics
+from .models import MAX_INTEGER, Card, CardImage, CardInfo, CardCollection, Fusion, FusionMaterialGroup, Language
+from .optimizer import DeckSearch, collection_pool, optimize_deck
+from .simulator import DECK_SIZE, HandEvaluator, deck_from_collection, simulate
+from .signals import reference_data_changed
+from .snapshot import SnapshotError, load_snapshot
+from . import views
 
 User = get_user_model()
 
+# Tests must not leave their data version stamps or cached pages in the shared caches.
+_local_caches = override_settings(CACHES=LOCAL_CACHES)
+
+
+def setUpModule():
+    _local_caches.enable()
+
+
+def tearDownModule():
+    _local_caches.disable()
+
 
 class DeckFusionCalculatorTest(TestCase):
     def setUp(self):
@@ -67,3 +100,771 @@ class DeckFusionCalculatorTest(TestCase):
 
         # We expect one secondary fusion (from FusionB) based on our test data.
         self.assertEqual(len(secondary_possible_fusions), 1)
+
+    def test_deck_fusion_calculator_primary_fusions(self):
+        self.client.login(username='testuser', password='password')
+        response = self.client.get(reverse('deck_fusion_calculator'))
+        possible_fusions = response.context['possible_fusions']
+        self.assertEqual([(f['fusion'], f['material1'], f['material2'], f['result']) for f in possible_fusions],
+                         [(self.fusionA, self.card1, self.card2, self.card3),
+                          (self.fusionB, self.card3, self.card2, self.card4)])
+
+    def test_deck_fusion_calculator_query_count_is_constant(self):
+        self.client.login(username='testuser', password='password')
+        url = reverse('deck_fusion_calculator')
+        self.client.get(url)
+        # Session and user, then one query each for the referenced cards and fusions;
+        # the owned cards are not read again while the cached results are current.
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_deck_fusion_cache_invalidated_on_collection_change(self):
+        self.client.login(username='testuser', password='password')
+        url = reverse('deck_fusion_calculator')
+        stats_url = reverse('deck_fusion_cache_stats')
+        before = self.client.get(stats_url).json()
+
+        self.client.get(url)
+        self.client.get(url)
+        CardCollection.objects.filter(user=self.user, card=self.card1).get().delete()
+        response = self.client.get(url)
+
+        after = self.client.get(stats_url).json()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        self.assertEqual([f['fusion'] for f in response.context['possible_fusions']], [self.fusionB])
+
+    def test_collection_sorts_on_integer_stats(self):
+        spell = Card.objects.create(card_name="Spell")
+        info = CardInfo.objects.create(card=spell, number=5, atk_def="", card_type="Magic", rarity="C", lore="...")
+        self.assertEqual((info.atk, info.defense), (None, None))
+        self.assertEqual(CardInfo.objects.get(card=self.card2).defense, 1000)
+
+        self.client.login(username='testuser', password='password')
+        url = reverse('collection_edit')
+        response = self.client.get(url, {'sort': 'atk', 'order': 'desc'})
+        cards = [form.instance.card for form in response.context['formset']]
+        self.assertEqual(cards, [self.card4, self.card3, self.card2, self.card1, spell])
+        response = self.client.get(url, {'sort': 'def', 'order': 'asc'})
+        cards = [form.instance.card for form in response.context['formset']]
+        self.assertEqual(cards, [spell, self.card2, self.card3, self.card4, self.card1])
+
+    def test_collection_page_query_count_is_constant(self):
+        url = reverse('collection_edit')
+
+        def queries_for_new_user(username):
+            User.objects.create_user(username=username, password='password')
+            self.client.login(username=username, password='password')
+            with CaptureQueriesContext(connection) as new_user:
+                self.client.get(url)
+            with CaptureQueriesContext(connection) as existing_user:
+                self.client.get(url)
+            return len(new_user.captured_queries), len(existing_user.captured_queries)
+
+        small = queries_for_new_user('small')
+        for number in range(100, 120):
+            Card.objects.create(card_name=f"Extra{number}")
+        self.assertEqual(queries_for_new_user('large'), small)
+        self.assertEqual(CardCollection.objects.filter(user__username='large').count(), Card.objects.count())
+
+    def test_collection_delta_updates_only_changed_cards(self):
+        self.client.login(username='testuser', password='password')
+        url = reverse('collection_delta')
+        deck_url = reverse('deck_fusion_calculator')
+        self.client.get(deck_url)
+
+        new_card = Card.objects.create(card_name="Card5")
+        # Session, user, the card id check and one upsert, inside the test's savepoint.
+        with self.assertNumQueries(6):
+            response = self.client.patch(url, {str(self.card1.pk): 3, str(new_card.pk): 2},
+                                         content_type='application/json')
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(response.json()['version'], collection_version(self.user.pk))
+        quantities = dict(CardCollection.objects.filter(user=self.user).values_list('card_id', 'quantity'))
+        self.assertEqual(quantities, {self.card1.pk: 3, self.card2.pk: 1, self.card3.pk: 1, self.card4.pk: 1,
+                                      new_card.pk: 2})
+
+        # The bulk upsert bumps the collection version, so cached deck results are recomputed.
+        self.client.patch(url, {str(self.card1.pk): 0}, content_type='application/json')
+        response = self.client.get(deck_url)
+        self.assertEqual([f['fusion'] for f in response.context['possible_fusions']], [self.fusionB])
+
+    def test_collection_delta_rejects_bad_changes(self):
+        self.client.login(username='testuser', password='password')
+        url = reverse('collection_delta')
+        for body in ([1, 2], {str(self.card1.pk): -1}, {str(self.card1.pk): "2"}, {"999": 1},
+                     {str(self.card1.pk): 2**31}, {str(self.card1.pk): 2**64}, {str(2**64): 1}, {"x": 1}):
+            response = self.client.patch(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.client.post(url, {}).status_code, 405)
+        self.assertEqual(CardCollection.objects.get(user=self.user, card=self.card1).quantity, 1)
+
+        response = self.client.patch(url, {str(self.card1.pk): 2**31 - 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_collection_export_round_trip(self):
+        self.client.login(username='testuser', password='password')
+        CardCollection.objects.filter(user=self.user, card=self.card2).update(quantity=0)
+        response = self.client.get(reverse('collection_export'))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        csv_data = b"".join(response.streaming_content)
+        self.assertEqual(csv_data.decode().splitlines(),
+                         ["number,card_name,quantity", "1,Card1,1", "3,Card3,1", "4,Card4,1"])
+
+        response = self.client.get(reverse('collection_export'), {'format': 'json', 'filter': 'all'})
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(rows[1], {'number': 2, 'card_name': "Card2", 'quantity': 0})
+
+        # Re-importing the CSV with replace restores exactly the exported quantities.
+        CardCollection.objects.filter(user=self.user).update(quantity=5)
+        upload = SimpleUploadedFile("collection.csv", csv_data, content_type="text/csv")
+        response = self.client.post(reverse('collection_import'), {'file': upload, 'replace': 'on'}, follow=True)
+        self.assertContains(response, "Imported 3 cards.")
+        quantities = dict(CardCollection.objects.filter(user=self.user).values_list('card_id', 'quantity'))
+        self.assertEqual(quantities, {self.card1.pk: 1, self.card2.pk: 0, self.card3.pk: 1, self.card4.pk: 1})
+
+    def test_collection_import_is_all_or_nothing(self):
+        self.client.login(username='testuser', password='password')
+        url = reverse('collection_import')
+        upload = SimpleUploadedFile("collection.json", json.dumps([
+            {"number": 1, "quantity": 3},
+            {"number": 99, "quantity": 1},
+        ]).encode())
+        response = self.client.post(url, {'file': upload}, follow=True)
+        self.assertContains(response, "there is no card number 99")
+        self.assertEqual(CardCollection.objects.get(user=self.user, card=self.card1).quantity, 1)
+
+        upload = SimpleUploadedFile("collection.csv", f"number,quantity\n1,{2**64}\n".encode())
+        response = self.client.post(url, {'file': upload}, follow=True)
+        self.assertContains(response, "Line 2: quantity must be from 0")
+
+        upload = SimpleUploadedFile("collection.json", b'[{"number": 1, "quantity": 3}]')
+        self.client.post(url, {'file': upload})
+        self.assertEqual(CardCollection.objects.get(user=self.user, card=self.card1).quantity, 3)
+
+
+class FusionSearchApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client.login(username='testuser', password='password')
+
+        self.card1 = Card.objects.create(card_name="Card1")
+        CardInfo.objects.create(card=self.card1, number=1, atk_def="1000 / 2000", card_type="Dragon", rarity="R",
+                                lore="...")
+        self.card2 = Card.objects.create(card_name="Card2")
+        CardInfo.objects.create(card=self.card2, number=2, atk_def="1500 / 1000", card_type="Spellcaster", rarity="R",
+                                lore="...")
+        self.card3 = Card.objects.create(card_name="Card3")
+        CardInfo.objects.create(card=self.card3, number=3, atk_def="2000 / 1500", card_type="Warrior", rarity="R",
+                                lore="...")
+        self.card4 = Card.objects.create(card_name="Card4")
+        CardInfo.objects.create(card=self.card4, number=4, atk_def="2500 / 1500", card_type="Warrior", rarity="R",
+                                lore="...")
+
+        # card1 + card2 -> card3, then card3 + card4 -> card4's fusion.
+        self.fusionA = Fusion.objects.create(number=3, name="FusionA", result_card=self.card3)
+        groupA = FusionMaterialGroup.objects.create(fusion=self.fusionA)
+        groupA.material1.add(self.card1)
+        groupA.material2.add(self.card2)
+
+        self.card5 = Card.objects.create(card_name="Card5")
+        CardInfo.objects.create(card=self.card5, number=5, atk_def="3000 / 2500", card_type="Dragon", rarity="R",
+                                lore="...")
+        self.fusionB = Fusion.objects.create(number=5, name="FusionB", result_card=self.card5)
+        groupB = FusionMaterialGroup.objects.create(fusion=self.fusionB)
+        groupB.material1.add(self.card3)
+        groupB.material2.add(self.card4)
+
+        self.url = reverse('fusion_search_api')
+
+    def search(self, *cards):
+        return self.client.get(self.url, {'cards': ",".join(str(card.pk) for card in cards)}).json()
+
+    def test_primary_and_secondary_fusions(self):
+        data = self.search(self.card2, self.card1, self.card4)
+        self.assertEqual([f['fusion_name'] for f in data['primary_fusions']], ["FusionA"])
+        self.assertEqual(data['primary_fusions'][0]['result']['atk_def'], "2000 / 1500")
+        self.assertEqual([f['fusion_name'] for f in data['secondary_fusions']], ["FusionB"])
+
+    def test_fusion_chains(self):
+        chains = self.search(self.card4, self.card1, self.card2)['fusion_chains']
+        self.assertEqual([chain['result']['name'] for chain in chains], ["Card5", "Card3"])
+        self.assertEqual([(step['material1']['name'], step['material2']['name'], step['result']['name'])
+                          for step in chains[0]['steps']],
+                         [("Card1", "Card2", "Card3"), ("Card3", "Card4", "Card5")])
+
+    def test_oversized_hand_is_rejected(self):
+        response = self.client.get(self.url, {'cards': ",".join([str(self.card1.pk)] * (views.MAX_HAND + 1))})
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_card_ids_are_rejected(self):
+        for cards in ('²', f'{self.card1.pk},x', '0', '9' * 5000):
+            self.assertEqual(self.client.get(self.url, {'cards': cards}).status_code, 400)
+
+    def test_fusion_chains_need_fusable_intermediate(self):
+        # card3 is a fusion result but cannot be made from this hand, so FusionB is out of reach.
+        self.assertEqual(self.search(self.card1, self.card4)['fusion_chains'], [])
+
+    def test_card_fusion_uses(self):
+        data = self.client.get(reverse('card_fusion_uses', args=[self.card3.pk])).json()
+        self.assertEqual([(use['fusion_name'], [p['name'] for p in use['partners']], use['result']['name'])
+                          for use in data['fusion_uses']], [("FusionB", ["Card4"], "Card5")])
+
+        response = self.client.get(reverse('card_detail', args=[self.card2.pk]))
+        self.assertEqual([use['fusion_name'] for use in response.context['fusion_uses']], ["FusionA"])
+        self.assertContains(response, "Used as Fusion Material")
+
+        self.assertEqual(self.client.get(reverse('card_fusion_uses', args=[0])).status_code, 404)
+
+    def test_detail_navigation_follows_numbers(self):
+        response = self.client.get(reverse('card_detail', args=[self.card1.pk]))
+        self.assertIsNone(response.context['prev_card'])
+        self.assertEqual(response.context['next_card']['pk'], self.card2.pk)
+        self.assertContains(response, f'<link rel="prefetch" href="{reverse("card_detail", args=[self.card2.pk])}">')
+
+        # A card numbered before the others is created last; the cached index is rebuilt.
+        card0 = Card.objects.create(card_name="Card0")
+        CardInfo.objects.create(card=card0, number=0, atk_def="0 / 0", card_type="Fiend", rarity="C", lore="...")
+        response = self.client.get(reverse('card_detail', args=[self.card1.pk]))
+        self.assertEqual(response.context['prev_card']['pk'], card0.pk)
+
+        response = self.client.get(reverse('fusion_detail', args=[self.fusionA.pk]))
+        self.assertIsNone(response.context['prev_fusion'])
+        self.assertEqual(response.context['next_fusion']['pk'], self.fusionB.pk)
+
+    def test_reference_pages_answer_conditional_requests(self):
+        url = reverse('card_detail', args=[self.card1.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('fusion_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.fusionA.name = "FusionA2"
+        self.fusionA.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_reference_pages_do_not_revalidate_across_logins(self):
+        url = reverse('card_detail', args=[self.card1.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('logout'))
+        self.client.post(reverse('login'), {'username': 'testuser', 'password': 'password'})
+        # The cached page holds the old CSRF token, so it must be sent again.
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.client.cookies['csrftoken'] = 'a' * 32
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_fragments_are_cached_per_data_version(self):
+        url = reverse('fusion_detail', args=[self.fusionB.pk])
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(url)
+        # Session, user and the fusion itself; the groups and materials come from the fragment cache.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertLess(3, len(cold.captured_queries))
+        self.assertContains(response, "Material Group 1")
+
+        Card.objects.filter(pk=self.card4.pk).update(card_name="Renamed")
+        reference_data_changed()
+        self.assertContains(self.client.get(url), "Renamed")
+
+    @override_settings(QUERY_METRICS=True)
+    def test_query_metrics(self):
+        metrics.reset()
+        response = self.client.get(self.url, {'cards': f"{self.card1.pk},{self.card2.pk}"})
+        self.assertIn('X-Query-Count', response)
+        self.assertEqual(response['X-Query-Budget'], "8")
+        for path in ('/no-such-page/', '/another-missing-page/'):
+            self.assertEqual(self.client.get(path).status_code, 404)
+
+        # Only staff may read the metrics.
+        self.assertEqual(self.client.get(reverse('query_metrics')).status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        stats = self.client.get(reverse('query_metrics')).json()
+        self.assertEqual(stats['fusion_search_api']['requests'], 1)
+        self.assertEqual(stats['fusion_search_api']['queries_total'], int(response['X-Query-Count']))
+        self.assertEqual(stats[UNRESOLVED]['requests'], 2)
+        self.assertFalse(any(name.startswith('/') for name in stats))
+
+    def test_query_fingerprint_ignores_literals(self):
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+                         fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 1'))
+
+    @override_settings(QUERY_METRICS=True, QUERY_BUDGET_STRICT=True)
+    def test_query_budget_strict_mode(self):
+        self.search(self.card1, self.card2)
+        with mock.patch.object(views.fusion_search_api, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.search(self.card1, self.card2)
+
+    def test_lookup_does_not_query_fusion_tables(self):
+        self.search(self.card1, self.card2)
+        # Only the session and user lookups remain once the index is warm.
+        with self.assertNumQueries(2):
+            self.search(self.card1, self.card2, self.card3, self.card4)
+
+    def test_index_rebuilds_when_fusions_change(self):
+        self.assertEqual(self.search(self.card1, self.card4)['primary_fusions'], [])
+        group = FusionMaterialGroup.objects.create(fusion=self.fusionA)
+        group.material1.add(self.card4)
+        group.material2.add(self.card1)
+        self.assertEqual([f['fusion_name'] for f in self.search(self.card1, self.card4)['primary_fusions']],
+                         ["FusionA"])
+
+    def test_index_follows_the_shared_data_version(self):
+        index = get_fusion_index()
+        # A loader in another worker process only moves the version stored in the shared cache.
+        bump_fusion_data_version()
+        self.assertIsNot(get_fusion_index(), index)
+
+    def test_version_stamps_survive_a_cleared_page_cache(self):
+        version = fusion_data_version()
+        cache.clear()
+        self.assertEqual(fusion_data_version(), version)
+
+    def test_batch_lookup_deduplicates_hands(self):
+        hands = [[self.card1.pk, self.card2.pk], [self.card2.pk, self.card1.pk], [self.card3.pk, self.card4.pk]]
+        response = self.client.post(reverse('fusion_search_batch_api'), {'hands': hands},
+                                    content_type='application/json')
+        data = response.json()
+        self.assertEqual((data['hands'], data['unique_hands']), (3, 2))
+        key = f"{self.card1.pk},{self.card2.pk}"
+        self.assertEqual(data['results'][key], self.search(self.card1, self.card2))
+        self.assertEqual([f['fusion_name'] for f in data['results'][f"{self.card3.pk},{self.card4.pk}"]
+                          ['primary_fusions']], ["FusionB"])
+
+    def test_batch_lookup_rejects_malformed_body(self):
+        response = self.client.post(reverse('fusion_search_batch_api'), {'cards': [1, 2]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_lookup_rejects_bad_ids_and_oversized_batches(self):
+        url = reverse('fusion_search_batch_api')
+        for hands in ([[True, self.card2.pk]], [[-1, self.card2.pk]], [[1.5]],
+                      [[self.card1.pk] * (views.MAX_HAND + 1)],
+                      [[self.card1.pk, self.card2.pk]] * (views.MAX_BATCH_HANDS + 1)):
+            response = self.client.post(url, {'hands': hands}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, hands)
+
+    def test_batch_lookup_rejects_hands_that_are_not_arrays(self):
+        url = reverse('fusion_search_batch_api')
+        for hands in (["12"], [{"1": 2}], "12", {"12": [1, 2]}, None):
+            response = self.client.post(url, {'hands': hands}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, hands)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        # Created out of number order so pages must follow numbers rather than pks.
+        self.cards = {}
+        for number in (4, 2, 7, 1, 6, 3, 5):
+            card = Card.objects.create(card_name=f"Card{number}")
+            CardInfo.objects.create(card=card, number=number, atk_def="1000 / 1000", card_type="Warrior", rarity="C",
+                                    lore="...")
+            self.cards[number] = card
+        for number in (3, 1, 2):
+            Fusion.objects.create(number=number, name=f"Fusion{number}", result_card=self.cards[number])
+
+    def test_card_pages_walk_forward_and_back(self):
+        response = self.client.get(reverse('card_list_api'), {'size': 3}).json()
+        self.assertEqual([card['number'] for card in response['cards']], [1, 2, 3])
+        self.assertIsNone(response['previous'])
+
+        response = self.client.get(response['next']).json()
+        self.assertEqual([card['number'] for card in response['cards']], [4, 5, 6])
+        last = self.client.get(response['next']).json()
+        self.assertEqual([card['number'] for card in last['cards']], [7])
+        self.assertIsNone(last['next'])
+
+        response = self.client.get(response['previous']).json()
+        self.assertEqual([card['number'] for card in response['cards']], [1, 2, 3])
+        self.assertIsNone(response['previous'])
+
+    def test_list_pages_run_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('card_list'), {'size': 3})
+        self.assertEqual([card.card_info.number for card in response.context['cards']], [1, 2, 3])
+        self.assertContains(response, f'?after=3-{self.cards[3].pk}&size=3')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('fusion_list_api')).json()
+        self.assertEqual([fusion['number'] for fusion in response['fusions']], [1, 2, 3])
+        self.assertEqual(response['fusions'][0]['result']['name'], "Card1")
+
+    @override_settings(QUERY_METRICS=True, QUERY_BUDGET_STRICT=True)
+    def test_list_apis_keep_their_budget_when_logged_in(self):
+        User.objects.create_user(username='testuser', password='password')
+        self.client.login(username='testuser', password='password')
+        for name in ('card_list_api', 'fusion_list_api'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        for cursor in ('x', '1-x', '1-2-3', '-1-2', '1-0', 'None-3'):
+            self.assertEqual(self.client.get(reverse('fusion_list'), {'after': cursor}).status_code, 400, cursor)
+            self.assertEqual(self.client.get(reverse('card_list_api'), {'before': cursor}).status_code, 400, cursor)
+
+    def test_cards_without_a_number_come_last(self):
+        unnumbered = [Card.objects.create(card_name=f"Unnumbered{i}") for i in range(3)]
+        numbers = []
+        response = self.client.get(reverse('card_list_api'), {'size': 4}).json()
+        while True:
+            numbers.extend(card['number'] for card in response['cards'])
+            if not response['next']:
+                break
+            response = self.client.get(response['next']).json()
+        self.assertEqual(numbers, [1, 2, 3, 4, 5, 6, 7, None, None, None])
+        self.assertEqual([card['id'] for card in response['cards']], [card.pk for card in unnumbered[1:]])
+
+        response = self.client.get(response['previous']).json()
+        self.assertEqual([card['number'] for card in response['cards']], [5, 6, 7, None])
+        self.assertEqual(response['cards'][-1]['id'], unnumbered[0].pk)
+        response = self.client.get(response['previous']).json()
+        self.assertEqual([card['number'] for card in response['cards']], [1, 2, 3, 4])
+
+
+class CardExportTest(TestCase):
+    def setUp(self):
+        for number in (2, 1):
+            card = Card.objects.create(card_name=f"Card{number}")
+            Language.objects.create(card=card, japanese=f"カード{number}", romaaji=f"Kādo {number}",
+                                    translated=f"Card {number}")
+            CardImage.objects.create(card=card, src=f"https://example.com/{number}.png", alt=f"{number}.png",
+                                     width=160, height=144, data_file_width=160, data_file_height=144)
+            CardInfo.objects.create(card=card, number=number, atk_def="1000 / 1000", card_type="Warrior",
+                                    rarity="C", lore="...")
+        self.url = reverse('card_export')
+
+    def test_ndjson_export(self):
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['fields']['info']['Number'] for record in records], [1, 2])
+        self.assertEqual(records[0]['fields']['languages']['Japanese'], "カード1")
+        self.assertEqual(records[0]['fields']['image']['width'], 160)
+
+    def test_unchanged_export_is_not_modified(self):
+        response = self.client.get(self.url)
+        cards = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(cards), 2)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # The encoded export is cached, so serving it again does not touch the database.
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+            self.assertEqual(json.loads(b"".join(response.streaming_content)), cards)
+
+        language = Language.objects.get(translated="Card 1")
+        language.translated = "Renamed"
+        language.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'format': 'xml'}).status_code, 400)
+
+
+class CardAutocompleteTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='testuser', password='password')
+        self.client.login(username='testuser', password='password')
+        for number, name, japanese, romaaji, translated in (
+                (1, "B-Eye White Dragon", "ブルーアイズ・ホワイトドラゴン", "Burūaizu Howaito Doragon",
+                 "Blue-Eyes White Dragon"),
+                (2, "Mystical Elf", "ホーリー・エルフ", "Hōrī Erufu", "Mystical Elf"),
+                (3, "White Magical Hat", "ホワイト・シーフ", "Howaito Shīfu", "White Thief")):
+            card = Card.objects.create(card_name=name)
+            CardInfo.objects.create(card=card, number=number, atk_def="1000 / 1000", card_type="Dragon", rarity="C",
+                                    lore="...")
+            Language.objects.create(card=card, japanese=japanese, romaaji=romaaji, translated=translated)
+        self.url = reverse('card_autocomplete')
+
+    def labels(self, term):
+        return [result['label'] for result in self.client.get(self.url, {'term': term}).json()]
+
+    def test_matches_every_name_variant(self):
+        self.assertEqual(self.labels("blue eyes"), ["B-Eye White Dragon (Blue-Eyes White Dragon)"])
+        self.assertEqual(self.labels("ホワイト"), ["White Magical Hat (ホワイト・シーフ)",
+                                               "B-Eye White Dragon (ブルーアイズ・ホワイトドラゴン)"])
+        self.assertEqual(self.labels("horī"), ["Mystical Elf (Hōrī Erufu)"])
+
+    def test_name_prefix_ranks_before_word_prefix(self):
+        self.assertEqual(self.labels("white"), ["White Magical Hat (White Thief)", "B-Eye White Dragon"])
+
+    def test_fuzzy_fallback_tolerates_typos(self):
+        self.assertEqual(self.labels("mystcal elf"), ["Mystical Elf"])
+        self.assertEqual(self.labels("zzzz"), [])
+
+    def test_lookups_are_served_from_memory(self):
+        self.labels("white")
+        # Session and user only; the names come from the in-memory index.
+        with self.assertNumQueries(2):
+            self.labels("whi")
+        Card.objects.create(card_name="White Hole")
+        self.assertIn("White Hole", self.labels("white"))
+
+
+class FusionSnapshotTest(TestCase):
+    def setUp(self):
+        cards = []
+        for number, atk_def in enumerate(["1000 / 2000", "1500 / 1000", "2000 / 1500", "2500 / 1500"], start=1):
+            card = Card.objects.create(card_name=f"Card{number} ブルーアイズ")
+            CardInfo.objects.create(card=card, number=number, atk_def=atk_def, card_type="Dragon", rarity="R",
+                                    lore="...")
+            cards.append(card)
+        fusion = Fusion.objects.create(number=3, name="FusionA", result_card=cards[2])
+        group = FusionMaterialGroup.objects.create(fusion=fusion)
+        group.material1.add(cards[0], cards[3])
+        group.material2.add(cards[1])
+        Fusion.objects.create(number=4, name="Unlinked")
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "fusions.bin")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_snapshot_round_trip(self):
+        call_command("build_fusion_snapshot", output=self.path, stdout=StringIO())
+        expected = FusionIndex.build()
+        with self.assertNumQueries(0):
+            loaded = load_snapshot(self.path)
+        self.assertIsNotNone(loaded.data_version)
+        for attr in ("cards", "fusions", "pairs", "adjacency", "groups", "result_mask"):
+            self.assertEqual(getattr(loaded, attr), getattr(expected, attr), attr)
+
+    def test_truncated_snapshot_is_rejected(self):
+        call_command("build_fusion_snapshot", output=self.path, stdout=StringIO())
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 10)
+        with self.assertRaises(SnapshotError):
+            load_snapshot(self.path)
+
+    def test_workers_load_only_a_current_snapshot(self):
+        call_command("build_fusion_snapshot", output=self.path, stdout=StringIO())
+        with override_settings(FUSION_SNAPSHOT_PATH=self.path):
+            with self.assertNumQueries(0):
+                index = get_fusion_index()
+            self.assertEqual(index.data_version, fusion_data_version())
+            # Data loaded after the build outdates the snapshot, so the index comes from the database.
+            bump_fusion_data_version()
+            self.assertIsNone(get_fusion_index().data_version)
+
+
+class DeckSimulatorTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.cards = []
+        for number, atk_def in enumerate(["1000 / 2000", "1500 / 1000", "2000 / 1500", "900 / 900", "2800 / 2000"],
+                                         start=1):
+            card = Card.objects.create(card_name=f"Card{number}")
+            CardInfo.objects.create(card=card, number=number, atk_def=atk_def, card_type="Dragon", rarity="R",
+                                    lore="...")
+            self.cards.append(card)
+        card1, card2, card3, card4, card5 = self.cards
+        # card1 + card2 -> card3, card3 + card4 -> card5.
+        for result, material1, material2 in [(card3, card1, card2), (card5, card3, card4)]:
+            fusion = Fusion.objects.create(number=result.card_info.number, name=result.card_name, result_card=result)
+            group = FusionMaterialGroup.objects.create(fusion=fusion)
+            group.material1.add(material1)
+            group.material2.add(material2)
+        CardCollection.objects.create(user=self.user, card=card1, quantity=3)
+        CardCollection.objects.create(user=self.user, card=card2, quantity=3)
+        CardCollection.objects.create(user=self.user, card=card4, quantity=2)
+        self.index = FusionIndex.build()
+
+    def test_evaluator_follows_chains(self):
+        card1, card2, card3, card4, card5 = (card.pk for card in self.cards)
+        evaluator = HandEvaluator(self.index)
+        self.assertEqual(evaluator.evaluate([card4, card1, card2, card4, card4]), (2800, 2800))
+        self.assertEqual(evaluator.evaluate([card1, card2, card1, card2, card1]), (2000, 2000))
+        self.assertEqual(evaluator.evaluate([card1, card4, card1, card4, card1]), (0, 1000))
+
+    def test_simulation_is_reproducible(self):
+        deck = deck_from_collection(self.user)
+        self.assertEqual(len(deck), 8)
+        first = simulate(self.index, deck, 2500, seed=7, workers=0, batch_size=1000)
+        second = simulate(self.index, deck, 2500, seed=7, workers=0, batch_size=1000)
+        self.assertEqual(first['best_atk'], second['best_atk'])
+        self.assertEqual(sum(first['best_atk'].values()), 2500)
+        self.assertEqual(first['best_atk'].keys() - {1000, 1500, 2000, 2800}, set())
+        self.assertGreater(first['threshold_rate'], 0)
+
+    def test_deck_from_huge_collection_row(self):
+        CardCollection.objects.filter(user=self.user, card=self.cards[0]).update(quantity=MAX_INTEGER)
+        deck = deck_from_collection(self.user)
+        self.assertEqual(len(deck), DECK_SIZE)
+        self.assertEqual(Counter(deck), {self.cards[1].pk: 3, self.cards[0].pk: DECK_SIZE - 3})
+
+    def test_simulation_rejects_bad_counts(self):
+        deck = deck_from_collection(self.user)
+        for hands, batch_size in ((-1, 1000), (10, 0), (10, -5)):
+            with self.assertRaises(ValueError):
+                simulate(self.index, deck, hands, workers=0, batch_size=batch_size)
+
+    def test_optimizer_finds_fusion_deck(self):
+        filler = Card.objects.create(card_name="Filler")
+        CardInfo.objects.create(card=filler, number=6, atk_def="1200 / 1200", card_type="Rock", rarity="R", lore="...")
+        CardCollection.objects.create(user=self.user, card=filler, quantity=10)
+        index = FusionIndex.build()
+        pool = collection_pool(self.user)
+
+        search = DeckSearch(HandEvaluator(index), pool, deck_size=8, samples=300)
+        greedy = search.initial_deck()
+        greedy_score = sum(search.score_hand(greedy, slots) for slots in search.hands) / len(search.hands)
+
+        result = optimize_deck(index, pool, seconds=0.5, deck_size=8, samples=300, workers=0)
+        self.assertEqual(len(result['deck']), 8)
+        self.assertGreater(result['expected_best_atk'], greedy_score)
+        self.assertIn(self.cards[0].pk, result['deck'])
+        for card_id, count in Counter(result['deck']).items():
+            self.assertLessEqual(count, pool[card_id])
+
+    def test_optimizer_clamps_huge_quantities(self):
+        CardCollection.objects.filter(user=self.user, card=self.cards[0]).update(quantity=MAX_INTEGER)
+        pool = collection_pool(self.user)
+        self.assertEqual(pool[self.cards[0].pk], DECK_SIZE)
+        result = optimize_deck(self.index, pool, seconds=0.1, samples=100, workers=0)
+        self.assertEqual(len(result['deck']), DECK_SIZE)
+        search = DeckSearch(HandEvaluator(self.index), {self.cards[0].pk: MAX_INTEGER}, deck_size=8, samples=10)
+        self.assertEqual(len(search.initial_deck()), 8)
+
+    def test_optimizer_rejects_small_collection(self):
+        with self.assertRaises(ValueError):
+            optimize_deck(self.index, collection_pool(self.user), seconds=0.1, workers=0)
+
+    def test_optimizer_api_validates_caches_and_limits_searches(self):
+        filler = Card.objects.create(card_name="Filler")
+        CardInfo.objects.create(card=filler, number=6, atk_def="1200 / 1200", card_type="Rock", rarity="R", lore="...")
+        CardCollection.objects.create(user=self.user, card=filler, quantity=40)
+        self.client.login(username='testuser', password='password')
+        url = reverse('deck_optimizer')
+        for seconds in ('nan', 'inf', '-1', '0', 'x', views.DECK_OPTIMIZER_MAX_SECONDS + 1):
+            self.assertEqual(self.client.get(url, {'seconds': seconds}).status_code, 400, seconds)
+
+        with mock.patch.object(views, 'optimize_deck', wraps=optimize_deck) as search:
+            first = self.client.get(url, {'seconds': 0.2})
+            second = self.client.get(url, {'seconds': 0.2})
+            self.assertEqual(search.call_count, 1)
+            self.assertEqual(search.call_args.kwargs['workers'], 0)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(sum(card['count'] for card in first.json()['deck']), 40)
+        # A different budget is a new search, refused until the cooldown ends.
+        response = self.client.get(url, {'seconds': 0.3})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(views.DECK_OPTIMIZER_COOLDOWN))
+
+
+class LoadCardsTest(TestCase):
+    def load(self, records, suffix=".json"):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, encoding="utf-8", delete=False) as f:
+            if suffix == ".ndjson":
+                f.write("".join(json.dumps(record) + "\n" for record in records))
+            else:
+                json.dump(records, f)
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command("load_cards", f.name, "--batch-size", "1", stdout=out)
+        return out.getvalue()
+
+    def record(self, number, name, atk_def="1000 / 800"):
+        return {"model": "dm1.card", "pk": number, "fields": {
+            "card_name": name,
+            "languages": {"Japanese": "カード", "Rōmaji": "Kādo", "Translated": name},
+            "image": {"src": "https://example.com/card.png", "alt": "card.png", "width": "160", "height": "144",
+                      "data_file_width": "160", "data_file_height": "144"},
+            "info": {"Number": f"{number:03d}", "ATK/DEF": atk_def, "Type": "Warrior", "Rarity": "C", "lore": "..."},
+        }}
+
+    def test_reload_upserts_on_card_number(self):
+        output = self.load([self.record(1, "Card1"), self.record(2, "Card2")])
+        self.assertIn("Loaded 2 cards (2 new), 8 of 8 rows written", output)
+        self.assertIn("rows/sec", output)
+
+        output = self.load([self.record(2, "Card2", atk_def="1200 / 800"), self.record(3, "Card3")])
+        self.assertIn("Loaded 2 cards (1 new), 5 of 8 rows written", output)
+        self.assertEqual(Card.objects.count(), 3)
+        self.assertEqual(Language.objects.count(), 3)
+        info = CardInfo.objects.get(number=2)
+        self.assertEqual((info.atk, info.defense), (1200, 800))
+
+    def test_card_export_reloads_unchanged(self):
+        self.load([self.record(1, "Card1"), self.record(2, "Card2")])
+        User.objects.create_user(username='testuser', password='password')
+        self.client.login(username='testuser', password='password')
+        response = self.client.get(reverse('card_export'), {'format': 'ndjson'})
+        records = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertIn("0 of 8 rows written", self.load(records, suffix=".ndjson"))
+
+    def test_card_without_number_is_rejected(self):
+        record = self.record(1, "Card1")
+        del record["fields"]["info"]
+        with self.assertRaises(CommandError):
+            self.load([record])
+        self.assertFalse(Card.objects.exists())
+
+
+class LoadFusionsTest(TestCase):
+    def setUp(self):
+        for number in (1, 2, 3, 4):
+            card = Card.objects.create(card_name=f"Card{number}")
+            CardInfo.objects.create(card=card, number=number, atk_def="1000 / 800")
+
+    def write(self, objects):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", encoding="utf-8", delete=False) as f:
+            json.dump(objects, f)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def load(self, groups):
+        fusions = self.write([{"model": "dm1.fusion", "pk": 7, "fields": {"number": "4", "name": "Card4"}}])
+        groups = self.write([{"model": "dm1.fusionmaterialgroup", "pk": i, "fields": {
+            "fusion": 7, "material1": material1, "material2": material2}} for i, (material1, material2) in
+            enumerate(groups, start=1)])
+        out = StringIO()
+        call_command("load_fusions", fusions, groups, stdout=out)
+        return out.getvalue()
+
+    def test_numbers_resolve_to_cards(self):
+        self.assertIn("Loaded 1 fusions (1 new), 2 material groups and 5 material rows",
+                      self.load([([1], [2, 3]), ([2], [3])]))
+        fusion = Fusion.objects.get()
+        self.assertEqual(fusion.result_card, Card.objects.get(card_name="Card4"))
+        group = fusion.material_groups.get(material2__card_name="Card2")
+        self.assertEqual([card.card_name for card in group.material1.all()], ["Card1"])
+
+        # Reloading replaces the recipe instead of adding to it.
+        self.assertIn("(0 new), 1 material groups", self.load([([1], [3])]))
+        self.assertEqual((Fusion.objects.count(), FusionMaterialGroup.objects.count()), (1, 1))
+
+    def test_unknown_material_rolls_back(self):
+        with self.assertRaises(CommandError):
+            self.load([([1], [2]), ([1], [99])])
+        self.assertFalse(Fusion.objects.exists())
+
+
+class BenchmarkSuiteTest(TestCase):
+    def test_seed_fixtures(self):
+        seed_fixtures()
+        self.assertEqual(Card.objects.count(), 365)
+        self.assertEqual(FusionMaterialGroup.objects.count(), 30)
+        self.assertFalse(Fusion.objects.filter(result_card__isnull=True).exists())
+
+    def test_synthetic_suite(self):
+        dataset = seed_synthetic(1)
+        self.assertEqual((Card.objects.count(), Fusion.objects.count()), (365, 27))
+        results = {result['name']: result for result in run_suite(dataset, repeat=1)}
+        self.assertEqual(results['fusion_index.fusion_chains']['queries'], 0)
+        self.assertEqual(results['view.fusion_search_api']['dataset'], "synthetic-x1")
+        self.assertIn('view.edit_collection', results)
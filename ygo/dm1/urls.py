@@ -1,16 +1,30 @@
 from django.urls import path
 from .views import CardListView, CardDetailView, FusionListView, FusionDetailView, HomeView, deck_fusion_calculator, \
-    edit_collection, fusion_calculator, card_autocomplete, fusion_search_api
+    edit_collection, fusion_calculator, card_autocomplete, fusion_search_api, \
+    fusion_search_batch_api, deck_fusion_cache_stats_api, deck_optimizer_api, card_fusion_uses_api, \
+    query_metrics, card_list_api, fusion_list_api, card_export, collection_delta_api, \
+    collection_export, collection_import
 
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
     path('cards/', CardListView.as_view(), name='card_list'),
+    path('cards/json/', card_list_api, name='card_list_api'),
+    path('cards/export/', card_export, name='card_export'),
     path('cards/<int:pk>/', CardDetailView.as_view(), name='card_detail'),
+    path('cards/<int:pk>/fusions/', card_fusion_uses_api, name='card_fusion_uses'),
     path("fusions/", FusionListView.as_view(), name="fusion_list"),
+    path("fusions/json/", fusion_list_api, name="fusion_list_api"),
     path("fusion/<int:pk>/", FusionDetailView.as_view(), name="fusion_detail"),
     path('collection/', edit_collection, name='collection_edit'),
+    path('collection/delta/', collection_delta_api, name='collection_delta'),
+    path('collection/export/', collection_export, name='collection_export'),
+    path('collection/import/', collection_import, name='collection_import'),
     path('collection/deck-fusion/', deck_fusion_calculator, name='deck_fusion_calculator'),
+    path('collection/deck-fusion/cache-stats/', deck_fusion_cache_stats_api, name='deck_fusion_cache_stats'),
+    path('collection/deck-optimizer/', deck_optimizer_api, name='deck_optimizer'),
     path('collection/fusion_calculator/', fusion_calculator, name='fusion_calculator'),
     path('collection/card_autocomplete/', card_autocomplete, name='card_autocomplete'),
     path('collection/fusion_search_api/', fusion_search_api, name='fusion_search_api'),
+    path('collection/fusion_search_batch_api/', fusion_search_batch_api, name='fusion_search_batch_api'),
+    path('metrics/queries/', query_metrics, name='query_metrics'),
 ]
@@ -1,64 +1,197 @@
+import hashlib
+import json
+import math
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.db.models import Value, ExpressionWrapper, F, IntegerField, Case, When
-from django.db.models.functions import StrIndex, Substr, Cast
+from django.db import transaction
+from django.db.models import F
 from django.forms import modelformset_factory
 from django.shortcuts import get_object_or_404, render, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition, require_http_methods, require_POST
 from django.views.generic import ListView, DetailView, TemplateView
-from .models import Card, Fusion, CardCollection, FusionMaterialGroup
+from .card_search import get_card_search_index
+from .caching import bump_collection_version, card_data_version, collection_version, deck_fusion_cache_stats, \
+    get_deck_fusions, get_optimized_deck, reference_data_version
+from .collection_io import COLLECTION_FORMATS, CollectionImportError, collection_rows, export_collection, \
+    import_collection, read_collection_file
+from .export import EXPORT_FORMATS, export_cards
+from .fusion_index import get_fusion_index
+from .instrumentation import metrics, query_budget
+from .models import MAX_INTEGER, Card, Fusion, CardCollection
+from .navigation import card_neighbors, fusion_neighbors
+from .optimizer import collection_pool, optimize_deck
+from .pagination import keyset_paginate, page_links
+
+DECK_OPTIMIZER_MAX_SECONDS = 10
+DECK_OPTIMIZER_COOLDOWN = 60
+# The chain search grows exponentially with the hand, so lookups are capped at a DM1 hand.
+MAX_HAND = 5
+MAX_BATCH_HANDS = 100
+
+
+def _reference_etag(request, *args, **kwargs):
+    # Pages also show the user's menu and pending messages, which the version does not cover.
+    if len(messages.get_messages(request)):
+        return None
+    # They also embed a CSRF token, and logging in rotates the CSRF secret, so a page
+    # cached before a logout or login must not revalidate: key on both.
+    get_token(request)
+    csrf = hashlib.sha256(request.META['CSRF_COOKIE'].encode()).hexdigest()[:16]
+    last_login = getattr(request.user, 'last_login', None)
+    login = int(last_login.timestamp() * 1e6) if last_login else 0
+    return f"{reference_data_version()}-{request.user.pk or 0}-{login}-{csrf}"
+
+
+def _reference_last_modified(request, *args, **kwargs):
+    if len(messages.get_messages(request)):
+        return None
+    modified = datetime.fromtimestamp(reference_data_version() / 1e9, tz=timezone.utc)
+    last_login = getattr(request.user, 'last_login', None)
+    return max(modified, last_login) if last_login else modified
+
+
+def reference_page(view):
+    """
+    Answer conditional GETs for pages built from the card and fusion data only: the
+    ETag and Last-Modified follow the reference data version, so a repeat visit
+    costs a 304 until the next data load.
+    """
+    view = condition(etag_func=_reference_etag, last_modified_func=_reference_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
+
+
+def _reference_api_etag(request, *args, **kwargs):
+    return str(reference_data_version())
+
+
+def _reference_api_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(reference_data_version() / 1e9, tz=timezone.utc)
+
+
+def reference_api(view):
+    """
+    Like reference_page for JSON built from the card and fusion data only. The
+    payload is the same for every user, so the validators never touch the session
+    or the user and cost no queries.
+    """
+    view = condition(etag_func=_reference_api_etag, last_modified_func=_reference_api_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, no_cache=True)
+        return response
+    return wrapper
 
 
 class HomeView(TemplateView):
     template_name = "home.html"
 
+@method_decorator(reference_page, name='dispatch')
 class CardListView(ListView):
     model = Card
     context_object_name = 'cards'
     template_name = 'card_list.html'
 
+    def get_queryset(self):
+        # One keyset page of cards joined with their number, without the long text columns.
+        self.page = keyset_paginate(_card_list_queryset(), 'card_info__number', self.request)
+        return self.page.items
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page'] = self.page
+        return context
+
+
+def _card_list_queryset():
+    return Card.objects.select_related('card_info').only('card_name', 'card_info__number')
+
+
+@query_budget(1)
+@reference_api
+def card_list_api(request):
+    """
+    Return one keyset page of cards ordered by card number as JSON, with the
+    URLs of the 'next' and 'previous' pages (null at either end).
+    """
+    page = keyset_paginate(_card_list_queryset(), 'card_info__number', request)
+    next_url, previous_url = page_links(request, page)
+    return JsonResponse({
+        'cards': [{
+            'id': card.pk,
+            'number': card.keyset_number,
+            'name': card.card_name,
+            'detail_url': reverse('card_detail', args=[card.pk]),
+        } for card in page.items],
+        'next': next_url,
+        'previous': previous_url,
+    })
+
+@method_decorator(reference_page, name='dispatch')
 class CardDetailView(DetailView):
-    model = Card
+    queryset = Card.objects.select_related('language', 'card_image', 'card_info')
     template_name = "card_detail.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Retrieve ordered list of card IDs (or another field for ordering)
-        card_ids = list(Card.objects.order_by('pk').values_list('pk', flat=True))
-        current_id = self.object.pk
-        try:
-            current_index = card_ids.index(current_id)
-        except ValueError:
-            current_index = 0
-
-        prev_card = None
-        next_card = None
-        if current_index > 0:
-            prev_card = Card.objects.get(pk=card_ids[current_index - 1])
-        if current_index < len(card_ids) - 1:
-            next_card = Card.objects.get(pk=card_ids[current_index + 1])
-
-        context['prev_card'] = prev_card
-        context['next_card'] = next_card
+        # Neighbors by card number come from a cached index instead of scanning the table.
+        context['prev_card'], context['next_card'] = card_neighbors(self.object.pk)
+        # Only computed when the cached page fragment has to be rendered.
+        context['fusion_uses'] = SimpleLazyObject(
+            lambda: _material_uses_payload(get_fusion_index(), self.object.pk)
+        )
+        context['data_version'] = reference_data_version()
         return context
 
-def card_list(request):
+
+@query_budget(6)
+def card_fusion_uses_api(request, pk):
     """
-    Return all Card objects as JSON.
+    Return JSON listing the fusions a card is a material of. Each entry contains
+    fusion_number, fusion_name, detail_url, the 'partners' it fuses with and the 'result'.
+    Served from the in-memory reverse index, without per-request joins.
     """
-    cards = Card.objects.all()
-    data = [
-        {
-            "id": card.id,
-            "card_name": card.card_name,
-            "languages": card.languages,
-            "image": card.image,
-            "info": card.info,
-        }
-        for card in cards
-    ]
-    return JsonResponse(data, safe=False)
+    index = get_fusion_index()
+    if pk not in index.cards:
+        return JsonResponse({'error': 'Card not found.'}, status=404)
+    return JsonResponse({'card': _card_payload(index, pk), 'fusion_uses': _material_uses_payload(index, pk)})
+
+def _card_export_etag(request):
+    fmt = request.GET.get('format', 'json')
+    return f"cards-{fmt}-{card_data_version()}" if fmt in EXPORT_FORMATS else None
+
+
+@condition(etag_func=_card_export_etag)
+def card_export(request):
+    """
+    Stream every card with its language, image and info rows, in the nested format
+    load_cards reads, as a JSON array or as NDJSON with ?format=ndjson.
+    The strong ETag follows the card data version, so unchanged exports get a 304.
+    """
+    fmt = request.GET.get('format', 'json')
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({'error': f"Unknown format {fmt!r}."}, status=400)
+    response = StreamingHttpResponse(export_cards(fmt, card_data_version()), content_type=EXPORT_FORMATS[fmt])
+    patch_cache_control(response, no_cache=True)
+    return response
 
 def card_detail(request, pk):
     card = get_object_or_404(Card, pk=pk)
@@ -71,38 +204,63 @@ def card_detail(request, pk):
     })
 
 
+@method_decorator(reference_page, name='dispatch')
 class FusionListView(ListView):
     model = Fusion
     template_name = "fusion_list.html"
     context_object_name = "fusions"
 
     def get_queryset(self):
-        return Fusion.objects.order_by('number')
+        self.page = keyset_paginate(_fusion_list_queryset(), 'number', self.request)
+        return self.page.items
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page'] = self.page
+        return context
+
+
+def _fusion_list_queryset():
+    return Fusion.objects.select_related('result_card').only('number', 'name', 'result_card__card_name')
+
+
+@query_budget(1)
+@reference_api
+def fusion_list_api(request):
+    """
+    Return one keyset page of fusions ordered by fusion number as JSON, with their
+    result card and the URLs of the 'next' and 'previous' pages.
+    """
+    page = keyset_paginate(_fusion_list_queryset(), 'number', request)
+    next_url, previous_url = page_links(request, page)
+    return JsonResponse({
+        'fusions': [{
+            'id': fusion.pk,
+            'number': fusion.number,
+            'name': fusion.name,
+            'detail_url': reverse('fusion_detail', args=[fusion.pk]),
+            'result': {
+                'id': fusion.result_card.pk,
+                'name': fusion.result_card.card_name,
+                'detail_url': reverse('card_detail', args=[fusion.result_card.pk]),
+            } if fusion.result_card else None,
+        } for fusion in page.items],
+        'next': next_url,
+        'previous': previous_url,
+    })
 
+@method_decorator(reference_page, name='dispatch')
 class FusionDetailView(DetailView):
-    model = Fusion
+    queryset = Fusion.objects.select_related(
+        'result_card__language', 'result_card__card_image', 'result_card__card_info'
+    )
     template_name = "fusion_detail.html"  # Adjust to your actual template name
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        fusion_numbers = list(Fusion.objects.order_by('number').values_list('number', flat=True))
-        current_number = self.object.number
-        try:
-            current_index = fusion_numbers.index(current_number)
-        except ValueError:
-            current_index = 0
-
-        prev_fusion = None
-        next_fusion = None
-        if current_index > 0:
-            prev_number = fusion_numbers[current_index - 1]
-            prev_fusion = Fusion.objects.get(number=prev_number)
-        if current_index < len(fusion_numbers) - 1:
-            next_number = fusion_numbers[current_index + 1]
-            next_fusion = Fusion.objects.get(number=next_number)
-
-        context['prev_fusion'] = prev_fusion
-        context['next_fusion'] = next_fusion
+        # Neighbors by fusion number come from a cached index instead of scanning the table.
+        context['prev_fusion'], context['next_fusion'] = fusion_neighbors(self.object.pk)
+        context['data_version'] = reference_data_version()
         return context
 
 def fusion_detail(request, pk):
@@ -116,13 +274,27 @@ def fusion_detail(request, pk):
     })
 
 
+def _create_missing_collection_rows(user):
+    """
+    Create the zero-quantity collection rows a user is missing with a single insert.
+    Only SELECTs when nothing is missing, whatever the number of cards.
+    """
+    owned = CardCollection.objects.filter(user=user).values('card_id')
+    missing = list(Card.objects.exclude(pk__in=owned).values_list('pk', flat=True))
+    if missing:
+        # ignore_conflicts covers a concurrent request creating the same rows.
+        with transaction.atomic():
+            CardCollection.objects.bulk_create(
+                [CardCollection(user=user, card_id=card_id, quantity=0) for card_id in missing],
+                batch_size=500, ignore_conflicts=True,
+            )
+
+
 @login_required
 def edit_collection(request):
     user = request.user
     # Ensure an entry exists for every card for this user.
-    all_cards = Card.objects.all()
-    for card in all_cards:
-        CardCollection.objects.get_or_create(user=user, card=card, defaults={'quantity': 0})
+    _create_missing_collection_rows(user)
 
     # Base queryset for this user's card collection.
     qs = CardCollection.objects.filter(user=user).select_related('card', 'card__card_info')
@@ -136,42 +308,15 @@ def edit_collection(request):
     sort_param = request.GET.get('sort', 'card__card_info__number')
     order = request.GET.get('order', 'asc')
 
-    # For sorting by ATK or DEF, annotate computed fields.
-    if sort_param in ['atk', 'def']:
-        qs = qs.annotate(
-            slash_pos=StrIndex('card__card_info__atk_def', Value(' / '))
-        ).annotate(
-            atk_str=Substr('card__card_info__atk_def', 1,
-                           ExpressionWrapper(F('slash_pos') - Value(1), output_field=IntegerField())),
-            atk=Cast('atk_str', IntegerField()),
-            def_str=Substr('card__card_info__atk_def',
-                           ExpressionWrapper(F('slash_pos') + Value(3), output_field=IntegerField()), Value(10)),
-            defense=Cast('def_str', IntegerField())
-        )
-        if sort_param == 'atk':
-            qs = qs.annotate(
-                missing_atk=Case(
-                    When(card__card_info__atk_def='', then=Value(1)),
-                    default=Value(0),
-                    output_field=IntegerField()
-                )
-            )
-            if order == 'desc':
-                qs = qs.order_by('missing_atk', '-atk')
-            else:
-                qs = qs.order_by('-missing_atk', 'atk')
-        else:  # sort_param == 'def'
-            qs = qs.annotate(
-                missing_def=Case(
-                    When(card__card_info__atk_def='', then=Value(1)),
-                    default=Value(0),
-                    output_field=IntegerField()
-                )
-            )
-            if order == 'desc':
-                qs = qs.order_by('missing_def', '-defense')
-            else:
-                qs = qs.order_by('-missing_def', 'defense')
+    # ATK and DEF sort on their indexed integer columns; cards without them (spells,
+    # traps) come first ascending and last descending.
+    sort_fields = {'atk': 'card__card_info__atk', 'def': 'card__card_info__defense'}
+    if sort_param in sort_fields:
+        field = F(sort_fields[sort_param])
+        if order == 'desc':
+            qs = qs.order_by(field.desc(nulls_last=True), 'card__card_info__number')
+        else:
+            qs = qs.order_by(field.asc(nulls_first=True), 'card__card_info__number')
     else:
         # For other fields, apply ordering directly.
         if order == 'desc':
@@ -204,70 +349,179 @@ def edit_collection(request):
     }
     return render(request, 'collection_edit.html', context)
 
+@query_budget(6)
 @login_required
-def deck_fusion_calculator(request):
-    # Get IDs of cards the user owns (with quantity >= 1)
-    owned_card_ids = set(
-        CardCollection.objects.filter(user=request.user, quantity__gte=1)
-        .values_list('card__pk', flat=True)
-    )
+@require_http_methods(["PATCH"])
+def collection_delta_api(request):
+    """
+    Apply a JSON body {card_id: quantity, ...} holding only the changed quantities to
+    the user's collection with a single upsert. Returns JSON {"updated": n,
+    "version": v} where 'version' is the collection version after the change.
+    """
+    try:
+        changes = json.loads(request.body)
+        quantities = {}
+        for card_id, quantity in changes.items():
+            if isinstance(quantity, bool) or not isinstance(quantity, int) or not 0 <= quantity <= MAX_INTEGER:
+                raise ValueError(card_id)
+            card_id = _card_id(card_id)
+            if card_id > MAX_INTEGER:
+                raise ValueError(card_id)
+            quantities[card_id] = quantity
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Expected a JSON object of the form {"card_id": quantity, ...} '
+                                      f'with integer quantities from 0 to {MAX_INTEGER}.'}, status=400)
+
+    known = set(Card.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+    unknown = sorted(set(quantities) - known)
+    if unknown:
+        return JsonResponse({'error': f"Unknown card ids: {unknown}."}, status=400)
+
+    with transaction.atomic():
+        CardCollection.objects.bulk_create(
+            [CardCollection(user=request.user, card_id=card_id, quantity=quantity)
+             for card_id, quantity in quantities.items()],
+            update_conflicts=True, unique_fields=['user', 'card'], update_fields=['quantity'],
+        )
+        # bulk_create sends no signals, so stamp the new collection version here.
+        version = bump_collection_version(request.user.pk) if quantities else collection_version(request.user.pk)
+    return JsonResponse({'updated': len(quantities), 'version': version})
 
-    # Build a set of fusion result card IDs that the user owns.
-    owned_result_cards = set(
-        Fusion.objects.filter(result_card__pk__in=owned_card_ids)
-        .values_list('result_card__pk', flat=True)
-    )
 
-    possible_fusions = []
-    secondary_possible_fusions = []
-
-    # Primary fusions: user must own at least one card from each required material group.
-    for fusion in Fusion.objects.prefetch_related('material_groups'):
-        for group in fusion.material_groups.all():
-            material1_owned = group.material1.filter(pk__in=owned_card_ids).first()
-            material2_owned = group.material2.filter(pk__in=owned_card_ids).first()
-            if material1_owned and material2_owned:
-                possible_fusions.append({
-                    'fusion': fusion,
-                    'material1': material1_owned,
-                    'material2': material2_owned,
-                    'result': fusion.result_card,
-                })
-
-    # Secondary fusions:
-    # Check if any card in a fusion’s material group is also in the set of owned fusion result cards.
-    for fusion in Fusion.objects.prefetch_related('material_groups'):
-        for group in fusion.material_groups.all():
-            # Option 1: A card from Material1 is a fusion result that the user owns
-            mat1_candidate = group.material1.filter(pk__in=owned_result_cards).first()
-            if mat1_candidate:
-                other_owned = group.material2.filter(pk__in=owned_card_ids).first()
-                if other_owned:
-                    secondary_possible_fusions.append({
-                        'fusion': fusion,
-                        'material1': mat1_candidate,
-                        'material2': other_owned,
-                        'result': fusion.result_card,
-                    })
-            # Option 2: A card from Material2 is a fusion result that the user owns
-            mat2_candidate = group.material2.filter(pk__in=owned_result_cards).first()
-            if mat2_candidate:
-                other_owned = group.material1.filter(pk__in=owned_card_ids).first()
-                if other_owned:
-                    secondary_possible_fusions.append({
-                        'fusion': fusion,
-                        'material1': other_owned,
-                        'material2': mat2_candidate,
-                        'result': fusion.result_card,
-                    })
+@login_required
+def collection_export(request):
+    """
+    Stream the user's collection keyed by card number as CSV, or as JSON with
+    ?format=json. Only owned cards are listed unless ?filter=all.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in COLLECTION_FORMATS:
+        return JsonResponse({'error': f"Unknown format {fmt!r}."}, status=400)
+    rows = collection_rows(request.user, owned_only=request.GET.get('filter', 'owned') != 'all')
+    response = StreamingHttpResponse(export_collection(rows, fmt), content_type=COLLECTION_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="collection.{fmt}"'
+    return response
+
+
+@login_required
+@require_POST
+def collection_import(request):
+    """
+    Import an uploaded CSV or JSON file of card numbers and quantities, as written by
+    collection_export, in one transaction. With 'replace' checked, cards missing
+    from the file are set to zero.
+    """
+    uploaded = request.FILES.get('file')
+    if uploaded is None:
+        messages.error(request, "Choose a CSV or JSON file to import.")
+        return redirect('collection_edit')
+
+    fmt = 'json' if uploaded.name.lower().endswith('.json') else 'csv'
+    try:
+        count = import_collection(request.user, read_collection_file(uploaded, fmt),
+                                  replace=bool(request.POST.get('replace')))
+    except CollectionImportError as e:
+        messages.error(request, f"Nothing was imported. {e}")
+    else:
+        messages.success(request, f"Imported {count} cards.")
+    return redirect('collection_edit')
+
+
+@query_budget(10)
+@login_required
+def deck_fusion_calculator(request):
+    def compute():
+        # Get IDs of cards the user owns (with quantity >= 1)
+        owned_card_ids = CardCollection.objects.filter(user=request.user, quantity__gte=1) \
+            .values_list('card__pk', flat=True)
+        # All material groups are matched against the owned-card bitset in one pass.
+        return get_fusion_index().collection_fusions(owned_card_ids)
+
+    # Results are cached per user until the collection or the fusion data changes.
+    primary, secondary = get_deck_fusions(request.user.pk, compute)
+
+    # Materialize the cards and fusions referenced by the results in two queries.
+    card_ids = set()
+    fusion_ids = set()
+    for match in primary + secondary:
+        card_ids.update((match['material1'], match['material2'], match['result']))
+        fusion_ids.add(match['fusion'])
+    cards = Card.objects.select_related('card_info').in_bulk(card_ids - {None})
+    fusions = Fusion.objects.in_bulk(fusion_ids)
+
+    def materialize(matches):
+        return [
+            {
+                'fusion': fusions[match['fusion']],
+                'material1': cards[match['material1']],
+                'material2': cards[match['material2']],
+                'result': cards.get(match['result']),
+            }
+            for match in matches
+        ]
 
     context = {
-        'possible_fusions': possible_fusions,
-        'secondary_possible_fusions': secondary_possible_fusions,
+        'possible_fusions': materialize(primary),
+        'secondary_possible_fusions': materialize(secondary),
     }
     return render(request, 'deck_fusion_calculator.html', context)
 
 
+@login_required
+def deck_fusion_cache_stats_api(request):
+    """Return the hit/miss counters of the per-user deck fusion cache as JSON."""
+    return JsonResponse(deck_fusion_cache_stats())
+
+
+@login_required
+def deck_optimizer_api(request):
+    """
+    Search the user's collection for the 40-card deck with the highest expected best-hand ATK.
+    Accepts an optional GET parameter 'seconds' (time budget, above 0 and at most
+    DECK_OPTIMIZER_MAX_SECONDS). Returns JSON with the deck (one entry per card with its
+    count), 'expected_best_atk', 'evaluations' and 'elapsed'.
+
+    The search runs in this process on a single core. Results are cached until the
+    collection or the fusion data changes, and each user may start one new search per
+    DECK_OPTIMIZER_COOLDOWN seconds.
+    """
+    try:
+        seconds = float(request.GET.get('seconds', 5))
+    except ValueError:
+        seconds = math.nan
+    if not (math.isfinite(seconds) and 0 < seconds <= DECK_OPTIMIZER_MAX_SECONDS):
+        return JsonResponse({'error': f'seconds must be a number above 0 and at most {DECK_OPTIMIZER_MAX_SECONDS}.'},
+                            status=400)
+
+    index = get_fusion_index()
+
+    def compute():
+        result = optimize_deck(index, collection_pool(request.user), seconds=seconds, workers=0)
+        counts = Counter(result['deck'])
+        result['deck'] = [dict(_card_payload(index, card_id), count=count)
+                          for card_id, count in sorted(counts.items())]
+        return result
+
+    try:
+        result = get_optimized_deck(request.user.pk, seconds, compute, DECK_OPTIMIZER_COOLDOWN)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if result is None:
+        response = JsonResponse({'error': 'A deck search was started recently. Try again later.'}, status=429)
+        response['Retry-After'] = str(DECK_OPTIMIZER_COOLDOWN)
+        return response
+    return JsonResponse(result)
+
+
+@staff_member_required
+def query_metrics(request):
+    """
+    Return the per-view query and latency aggregates recorded by QueryMetricsMiddleware.
+    Only served to staff users.
+    """
+    return JsonResponse(metrics.snapshot())
+
+
 @login_required
 def fusion_calculator(request):
     # Render the page; AJAX will handle fusion lookup.
@@ -276,141 +530,150 @@ def fusion_calculator(request):
 
 # --- Card Autocomplete AJAX ---
 @login_required
+@query_budget(4)
 def card_autocomplete(request):
     term = request.GET.get('term', '')
-    # Return at most 10 matching cards
-    cards = Card.objects.filter(card_name__icontains=term)[:10]
-    results = [
-        {'id': card.id, 'label': card.card_name, 'value': card.card_name}
-        for card in cards
-    ]
+    # Return at most 10 ranked matches over every name variant, served from memory
+    results = get_card_search_index().search(term)
     return JsonResponse(results, safe=False)
 
 
 # --- Fusion Search AJAX ---
+def _card_payload(index, card_id):
+    card = index.cards.get(card_id)
+    if card is None:
+        return {'id': None, 'name': '', 'atk_def': '', 'detail_url': ''}
+    return {
+        'id': card_id,
+        'name': card['name'],
+        'atk_def': card['atk_def'],
+        'detail_url': reverse('card_detail', args=[card_id]),
+    }
+
+
+def _fusion_payload(index, match):
+    fusion = index.fusions[match['fusion']]
+    return {
+        'fusion_number': fusion['number'],
+        'fusion_name': fusion['name'],
+        'material1': _card_payload(index, match['material1']),
+        'material2': _card_payload(index, match['material2']),
+        'result': _card_payload(index, fusion['result_id']),
+    }
+
+
+def _hand_results(index, card_ids):
+    """Build the fusion_search_api payload for one hand."""
+    # Primary fusions: any two selected cards that form a material pair.
+    primary_matches = index.fusions_for_hand(card_ids)
+
+    # Chains: every left-to-right fusion sequence the selected cards can play.
+    chains = index.fusion_chains(card_ids)
+
+    return {
+        'primary_fusions': [_fusion_payload(index, match) for match in primary_matches],
+        'secondary_fusions': [
+            _fusion_payload(index, chain['steps'][-1]) for chain in chains if len(chain['steps']) > 1
+        ],
+        'fusion_chains': [
+            {
+                'result': _card_payload(index, chain['result']),
+                'steps': [_fusion_payload(index, step) for step in chain['steps']],
+            }
+            for chain in chains
+        ],
+    }
+
+
+def _material_uses_payload(index, card_id):
+    uses = []
+    for fusion_id, partner_ids in index.material_uses(card_id):
+        fusion = index.fusions[fusion_id]
+        uses.append({
+            'fusion_number': fusion['number'],
+            'fusion_name': fusion['name'],
+            'detail_url': reverse('fusion_detail', args=[fusion_id]),
+            'partners': [_card_payload(index, partner_id) for partner_id in partner_ids],
+            'result': _card_payload(index, fusion['result_id']),
+        })
+    return uses
+
+
+@query_budget(8)
 @login_required
 def fusion_search_api(request):
     """
-    Expects a GET parameter 'cards' containing comma-separated card IDs.
-    Returns JSON with two lists: 'primary_fusions' and 'secondary_fusions'.
+    Expects a GET parameter 'cards' containing up to MAX_HAND comma-separated card IDs.
+    Returns JSON with three lists: 'primary_fusions', 'secondary_fusions' and 'fusion_chains'.
     Each fusion contains:
       - fusion_number, fusion_name
       - material1: {id, name, atk_def, detail_url}
       - material2: {id, name, atk_def, detail_url}
       - result: {id, name, atk_def, detail_url}
+    Secondary fusions are the last step of every chain longer than one fusion.
+    Each chain contains the final 'result' card and the 'steps' (fusions) producing it,
+    strongest result first.
+    Lookups are answered from the in-memory fusion index, without per-group queries.
     """
     card_ids_str = request.GET.get('cards', '')
     if not card_ids_str:
-        return JsonResponse({'primary_fusions': [], 'secondary_fusions': []})
+        return JsonResponse({'primary_fusions': [], 'secondary_fusions': [], 'fusion_chains': []})
 
+    values = [x for x in card_ids_str.split(',') if x.strip()]
+    if len(values) > MAX_HAND:
+        return JsonResponse({'error': f'A hand holds at most {MAX_HAND} cards.'}, status=400)
     try:
-        card_ids = [int(x) for x in card_ids_str.split(',') if x.isdigit()]
+        # Not isdigit(): it accepts digits such as '²' that int() rejects.
+        card_ids = [_card_id(x.strip()) for x in values]
     except ValueError:
-        card_ids = []
-
-    primary_fusions = []
-    secondary_fusions = []
-
-    # Primary fusions: Check if any Fusion has a material group where
-    # at least one card from material1 AND one card from material2 is in the given list.
-    for fusion in Fusion.objects.prefetch_related('material_groups'):
-        for group in fusion.material_groups.all():
-            mat1 = group.material1.filter(pk__in=card_ids).first()
-            mat2 = group.material2.filter(pk__in=card_ids).first()
-            if mat1 and mat2:
-                primary_fusions.append({
-                    'fusion_number': fusion.number,
-                    'fusion_name': fusion.name,
-                    'material1': {
-                        'id': mat1.id,
-                        'name': mat1.card_name,
-                        'atk_def': mat1.card_info.atk_def if hasattr(mat1, 'card_info') else '',
-                        'detail_url': reverse('card_detail', args=[mat1.id]),
-                    },
-                    'material2': {
-                        'id': mat2.id,
-                        'name': mat2.card_name,
-                        'atk_def': mat2.card_info.atk_def if hasattr(mat2, 'card_info') else '',
-                        'detail_url': reverse('card_detail', args=[mat2.id]),
-                    },
-                    'result': {
-                        'id': fusion.result_card.id if fusion.result_card else None,
-                        'name': fusion.result_card.card_name if fusion.result_card else '',
-                        'atk_def': fusion.result_card.card_info.atk_def if fusion.result_card and hasattr(
-                            fusion.result_card, 'card_info') else '',
-                        'detail_url': reverse('card_detail',
-                                              args=[fusion.result_card.id]) if fusion.result_card else '',
-                    }
-                })
-                break  # break inner loop if fusion found
-
-    # Secondary fusions: Check if any fusion's result card is also among the selected cards
-    # and can act as one of the materials.
-    for fusion in Fusion.objects.prefetch_related('material_groups'):
-        for group in fusion.material_groups.all():
-            # Option 1: Check if any card in material1 is also in the selected list and is a fusion result
-            mat1_candidate = group.material1.filter(pk__in=card_ids).first()
-            if mat1_candidate:
-                mat2 = group.material2.filter(pk__in=card_ids).first()
-                if mat2:
-                    secondary_fusions.append({
-                        'fusion_number': fusion.number,
-                        'fusion_name': fusion.name,
-                        'material1': {
-                            'id': mat1_candidate.id,
-                            'name': mat1_candidate.card_name,
-                            'atk_def': mat1_candidate.card_info.atk_def if hasattr(mat1_candidate, 'card_info') else '',
-                            'detail_url': reverse('card_detail', args=[mat1_candidate.id]),
-                        },
-                        'material2': {
-                            'id': mat2.id,
-                            'name': mat2.card_name,
-                            'atk_def': mat2.card_info.atk_def if hasattr(mat2, 'card_info') else '',
-                            'detail_url': reverse('card_detail', args=[mat2.id]),
-                        },
-                        'result': {
-                            'id': fusion.result_card.id if fusion.result_card else None,
-                            'name': fusion.result_card.card_name if fusion.result_card else '',
-                            'atk_def': fusion.result_card.card_info.atk_def if fusion.result_card and hasattr(
-                                fusion.result_card, 'card_info') else '',
-                            'detail_url': reverse('card_detail',
-                                                  args=[fusion.result_card.id]) if fusion.result_card else '',
-                        }
-                    })
-                    break
-            # Option 2: Check vice-versa for material2 candidate.
-            mat2_candidate = group.material2.filter(pk__in=card_ids).first()
-            if mat2_candidate:
-                mat1 = group.material1.filter(pk__in=card_ids).first()
-                if mat1:
-                    secondary_fusions.append({
-                        'fusion_number': fusion.number,
-                        'fusion_name': fusion.name,
-                        'material1': {
-                            'id': mat1.id,
-                            'name': mat1.card_name,
-                            'atk_def': mat1.card_info.atk_def if hasattr(mat1, 'card_info') else '',
-                            'detail_url': reverse('card_detail', args=[mat1.id]),
-                        },
-                        'material2': {
-                            'id': mat2_candidate.id,
-                            'name': mat2_candidate.card_name,
-                            'atk_def': mat2_candidate.card_info.atk_def if hasattr(mat2_candidate, 'card_info') else '',
-                            'detail_url': reverse('card_detail', args=[mat2_candidate.id]),
-                        },
-                        'result': {
-                            'id': fusion.result_card.id if fusion.result_card else None,
-                            'name': fusion.result_card.card_name if fusion.result_card else '',
-                            'atk_def': fusion.result_card.card_info.atk_def if fusion.result_card and hasattr(
-                                fusion.result_card, 'card_info') else '',
-                            'detail_url': reverse('card_detail',
-                                                  args=[fusion.result_card.id]) if fusion.result_card else '',
-                        }
-                    })
-                    break
+        return JsonResponse({'error': 'Card ids must be positive whole numbers.'}, status=400)
+    return JsonResponse(_hand_results(get_fusion_index(), card_ids))
 
-    return JsonResponse({
-        'primary_fusions': primary_fusions,
-        'secondary_fusions': secondary_fusions,
-    })
+
+def _card_id(value):
+    """Return a positive card id from a JSON number or digit string; raise ValueError otherwise."""
+    # bool is an int subclass, so `true` would otherwise pass as card 1.
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    card_id = int(value)
+    if card_id < 1:
+        raise ValueError(value)
+    return card_id
+
+
+@query_budget(8)
+@login_required
+@require_POST
+def fusion_search_batch_api(request):
+    """
+    Expects a JSON body {"hands": [[card_id, ...], ...]} of up to MAX_BATCH_HANDS hands of
+    up to MAX_HAND positive card IDs each.
+    Returns JSON {"results": {...}, "hands": n, "unique_hands": m} where 'results' maps each
+    hand, written as its sorted comma-separated card IDs, to the same payload
+    fusion_search_api returns. Identical hands in a batch are evaluated once.
+    """
+    error = JsonResponse({'error': 'Expected a JSON body of the form {"hands": [[card_id, ...], ...]}.'}, status=400)
+    try:
+        hands = json.loads(request.body)['hands']
+    except (ValueError, KeyError, TypeError):
+        return error
+    # Strings and objects are iterable too, but "12" is not the hand (1, 2).
+    if not isinstance(hands, list) or not all(isinstance(hand, list) for hand in hands):
+        return error
+    if len(hands) > MAX_BATCH_HANDS or any(len(hand) > MAX_HAND for hand in hands):
+        return JsonResponse({'error': f'A batch holds at most {MAX_BATCH_HANDS} hands of at most {MAX_HAND} cards.'},
+                            status=400)
+    try:
+        hands = [tuple(sorted(_card_id(card_id) for card_id in hand)) for hand in hands]
+    except ValueError:
+        return error
+
+    index = get_fusion_index()
+    results = {}
+    for hand in hands:
+        key = ",".join(str(card_id) for card_id in hand)
+        if key not in results:
+            results[key] = _hand_results(index, list(hand))
+
+    return JsonResponse({'results': results, 'hands': len(hands), 'unique_hands': len(results)})
 
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dm1.instrumentation.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,6 +48,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request query/latency metrics (response headers and /dm1/metrics/queries/), on by default with DEBUG.
+# With QUERY_BUDGET_STRICT, views that exceed their @query_budget raise instead of only reporting it.
+QUERY_METRICS = os.getenv('QUERY_METRICS', str(bool(DEBUG))) == 'True'
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+
 ROOT_URLCONF = 'ygo.urls'
 
 TEMPLATES = [
@@ -75,6 +82,29 @@ DATABASES = {
     }
 }
 
+# Every worker process and the loader commands must see the same cached data, so the
+# caches are shared between processes: on disk by default, or e.g. Redis or Memcached
+# through CACHE_BACKEND and CACHE_LOCATION. A process-local backend (LocMemCache)
+# leaves workers on stale data. Tests and run_benchmarks switch to dm1.caching.LOCAL_CACHES.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache'))
+CACHES = {
+    # Rendered fragments and computed results; safe to cull.
+    'default': {'BACKEND': CACHE_BACKEND, 'LOCATION': CACHE_LOCATION},
+    # dm1's data version stamps. Losing one makes every worker rebuild its indexes and
+    # ignore the fusion snapshot until it is rebuilt. On disk they get their own
+    # directory that is never culled; a Redis or Memcached server must not evict them.
+    'versions': {'BACKEND': CACHE_BACKEND, 'LOCATION': CACHE_LOCATION},
+}
+if CACHE_BACKEND.endswith('FileBasedCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+    CACHES['versions']['LOCATION'] = os.path.join(CACHE_LOCATION, 'versions')
+    CACHES['versions']['OPTIONS'] = {'MAX_ENTRIES': sys.maxsize}
+
+# Optional compiled fusion data, written by `manage.py build_fusion_snapshot`.
+# When the file exists, workers memory-map it instead of reading fusions from the database.
+FUSION_SNAPSHOT_PATH = os.getenv('FUSION_SNAPSHOT_PATH')
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [